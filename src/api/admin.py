@@ -1,7 +1,18 @@
+from typing import Any
+
+from starlette.requests import Request
 from starlette_admin.contrib.sqlmodel import ModelView
 
 from tables.user import User
+from database import users
 
 
 class UserView(ModelView):
     exclude_fields_from_list = [User.hashed_password]
+
+    async def after_edit(self, request: Request, obj: Any) -> None:
+        # username itself may have been edited, so the old key is unknown here
+        await users.broadcast_user_changed()
+
+    async def after_delete(self, request: Request, obj: Any) -> None:
+        await users.broadcast_user_changed(obj.username)
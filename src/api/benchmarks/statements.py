@@ -0,0 +1,73 @@
+"""Cost of building and compiling hot queries per call, with and without
+prebuilt statements from `database.statements`.
+
+Both paths go through the compiled cache the way `session.exec` does, so the
+difference is statement construction and cache key generation.
+Run from `src/api`: `python -m benchmarks.statements`
+"""
+
+import argparse
+import timeit
+from typing import Callable
+
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.util import LRUCache
+from sqlmodel import select
+
+from database import statements
+from tables.user import User
+
+
+dialect = postgresql.asyncpg.dialect()  # type: ignore
+
+
+def compile_cached(statement, compiled_cache: LRUCache) -> None:
+    compiled, _, _ = statement._compile_w_cache(
+        dialect, compiled_cache=compiled_cache, column_keys=[]
+    )
+    assert compiled is not None
+
+
+def built_per_call(compiled_cache: LRUCache) -> None:
+    statement = select(User).where(User.username == "username")
+    compile_cached(statement, compiled_cache)
+
+
+def built_per_call_bindparam(compiled_cache: LRUCache) -> None:
+    statement = select(User).where(User.username == bindparam("value"))
+    compile_cached(statement, compiled_cache)
+
+
+def prebuilt(compiled_cache: LRUCache) -> None:
+    statement = statements.select_where_equals(User, "username")
+    compile_cached(statement, compiled_cache)
+
+
+def built_without_cache(_: LRUCache) -> None:
+    select(User).where(User.username == "username").compile(dialect=dialect)
+
+
+CASES: dict[str, Callable[[LRUCache], None]] = {
+    "build + compile, no cache": built_without_cache,
+    "build + cached compile (before)": built_per_call,
+    "build with bindparam + cached compile": built_per_call_bindparam,
+    "prebuilt + cached compile (after)": prebuilt,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+    for name, case in CASES.items():
+        compiled_cache = LRUCache(100)
+        case(compiled_cache)  # warm up the cache
+        seconds = min(
+            timeit.repeat(lambda: case(compiled_cache), number=args.number, repeat=5)
+        )
+        print(f"{name:40} {seconds / args.number * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
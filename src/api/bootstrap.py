@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+from alembic.command import upgrade
+from alembic.config import Config
+from sqlalchemy import func, select
+
+from database import schema, users
+from database.crud import async_session, engine
+from services import hashing_service
+import settings
+
+
+LOCK_NAME = "bootstrap"
+
+logger = logging.getLogger("bootstrap")
+
+
+async def run() -> None:
+    """Migrates database to head and creates superuser. Runs under a transaction
+    level advisory lock, so concurrent runs wait for the first one to finish
+    and then find nothing to do"""
+    async with engine.begin() as connection:
+        lock = func.pg_advisory_xact_lock(func.hashtext(LOCK_NAME))
+        await connection.execute(select(lock))
+        await asyncio.to_thread(upgrade, Config(schema.ALEMBIC_CONFIG), "head")
+        await create_superuser()
+
+
+async def create_superuser() -> None:
+    """Hashes the password only if superuser doesn't exist yet"""
+    username = settings.env.SUPERUSER_USERNAME
+    async with async_session() as session:  # type: ignore
+        if await users.get_user_by_username(username, session) is not None:
+            return
+        await users.create_superuser(
+            username,
+            await hashing_service.ahash_password(settings.env.SUPERUSER_PASSWORD),
+            session,
+        )
+    logger.info(f"Created superuser {username}")
+
+
+async def main():
+    try:
+        await run()
+    finally:
+        hashing_service.pool.shutdown()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
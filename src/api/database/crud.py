@@ -1,61 +1,472 @@
-from typing import TypeVar
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, TypeVar
 
-from sqlalchemy.ext.asyncio import create_async_engine
+from fastapi import Request
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    String,
+    UniqueConstraint,
+    bindparam,
+    func,
+    text,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import SQLModel, select
+from sqlmodel import SQLModel, delete, select, update
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Executable
 from sqlalchemy.sql._typing import ColumnExpressionArgument
 
-from . import db_utils
+from . import db_utils, invalidation, statements
 
 try:
     from tables.base import IntBasicModel
     from settings import db
+    from utils.single_flight import SingleFlight
     import exceptions
 except ImportError:  # for alembic to work
     from ..tables.base import IntBasicModel
     from ..settings import db
+    from ..utils.single_flight import SingleFlight
     from .. import exceptions
 
 T = TypeVar("T")
 
-DB_URL = f"postgresql+asyncpg://{db.POSTGRES_USER}:{db.POSTGRES_PASSWORD}@{db.POSTGRES_HOST}/{db.POSTGRES_DB}"
+logger = logging.getLogger("db")
+
+
+def make_db_url(host: str) -> str:
+    return f"postgresql+asyncpg://{db.POSTGRES_USER}:{db.POSTGRES_PASSWORD}@{host}/{db.POSTGRES_DB}"
+
+
+DB_URL = make_db_url(db.POSTGRES_HOST)
 DB_URL_SYNC = DB_URL.replace("+asyncpg", "")
 
 DEFAULT_LIMIT = 20
+MAX_BULK_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+FILTER_OPERATORS = ("eq", "in", "gte", "lte", "prefix")
+# btree operator classes which serve LIKE 'prefix%' in any collation
+PATTERN_OPS = {"text_pattern_ops", "varchar_pattern_ops", "bpchar_pattern_ops"}
+
+# cookie with timestamp until which client reads go to primary after its write
+PRIMARY_COOKIE = "db_primary_until"
+
+
+def engine_options() -> dict[str, Any]:
+    if db.POSTGRES_PGBOUNCER:
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # unnamed statements may collide between server connections
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        connect_args = {
+            "statement_cache_size": db.POSTGRES_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": db.POSTGRES_STATEMENT_CACHE_SIZE,
+        }
+    return {
+        "echo": False,
+        "future": True,
+        "pool_pre_ping": True,
+        "pool_size": db.POSTGRES_POOL_SIZE,
+        "max_overflow": db.POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": db.POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": db.POSTGRES_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+
 
-engine = create_async_engine(DB_URL, echo=False, future=True, pool_pre_ping=True)
+def get_listen_dsn() -> str:
+    """DSN for the cache invalidation listener, which can't work through PgBouncer"""
+    if db.POSTGRES_LISTEN_HOST:
+        return make_db_url(db.POSTGRES_LISTEN_HOST).replace("+asyncpg", "")
+    if db.POSTGRES_PGBOUNCER:
+        raise RuntimeError(
+            "LISTEN doesn't work through PgBouncer in transaction mode, "
+            "set POSTGRES_LISTEN_HOST to the Postgres host"
+        )
+    return DB_URL_SYNC
+
+
+engine = create_async_engine(DB_URL, **engine_options())
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)  # type: ignore
 
+replica_engines = [
+    create_async_engine(make_db_url(host), **engine_options())
+    for host in db.POSTGRES_REPLICA_HOSTS
+]
+primary_read_session = sessionmaker(
+    engine.execution_options(postgresql_readonly=True),
+    class_=AsyncSession,
+    expire_on_commit=False,
+)  # type: ignore
+replica_sessions = [
+    sessionmaker(
+        replica.execution_options(postgresql_readonly=True),
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )  # type: ignore
+    for replica in replica_engines
+]
+
+
+def read_session(use_primary: bool = False) -> AsyncSession:
+    """Read only session on a random replica, or on primary if there are none"""
+    if use_primary or not replica_sessions:
+        return primary_read_session()  # type: ignore
+    return random.choice(replica_sessions)()  # type: ignore
+
+
+async def warm_up(statements: list[Executable]) -> None:
+    """Opens pool connections of every engine and prepares hot statements on them,
+    so first requests after start don't pay for it"""
+
+    async def prepare(connection: AsyncConnection) -> None:
+        for statement in statements:
+            await connection.execute(statement)
+        await connection.rollback()
+
+    async def warm_up_engine(db_engine: AsyncEngine) -> None:
+        async with AsyncExitStack() as stack:
+            # hold all connections at once, otherwise the pool reuses the first one
+            connections = [
+                await stack.enter_async_context(db_engine.connect())
+                for _ in range(db.POSTGRES_POOL_SIZE)
+            ]
+            await asyncio.gather(*(prepare(c) for c in connections))
 
-async def get_async_session() -> AsyncSession:  # type: ignore
+    try:
+        await asyncio.gather(*(warm_up_engine(e) for e in [engine, *replica_engines]))
+    except Exception as e:
+        logger.warning(f"Database pool warm up failed: {e}")
+
+
+def reads_from_primary(request: Request) -> bool:
+    if getattr(request.state, "db_wrote", False):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_async_session(request: Request) -> AsyncSession:  # type: ignore
+    # makes client read its own writes from primary for a while
+    request.state.db_wrote = True
     async with async_session() as session:  # type: ignore
         yield session  # type: ignore
 
 
+async def get_read_session(request: Request) -> AsyncSession:  # type: ignore
+    """Session for read only routes, never commits"""
+    async with read_session(reads_from_primary(request)) as session:  # type: ignore
+        yield session  # type: ignore
+
+
+def parse_fields(
+    db_table_type: type[SQLModel], fields: str | None
+) -> tuple[str, ...] | None:
+    """Validates comma separated column names, returns them in table order"""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",")}
+    columns = db_table_type.__table__.c  # type: ignore
+    unknown = requested - set(columns.keys())
+    if unknown:
+        raise exceptions.BadRequest(detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in columns.keys() if name in requested)
+
+
 async def get_all(
     session: AsyncSession,
     db_table_type: type[SQLModel],
     offset: int = 0,
     limit: int = DEFAULT_LIMIT,
-) -> list[SQLModel]:
-    statement = select(db_table_type).offset(offset).limit(limit)
-    res = await session.exec(statement)
-    await session.commit()
+    fields: tuple[str, ...] | None = None,
+    where: list[ColumnElement[bool]] | None = None,
+    order_by: list[ColumnElement] | None = None,
+) -> list[SQLModel] | list[dict[str, Any]]:
+    """Whole entities, or rows of only `fields` columns as dicts"""
+    statement = statements.select_page(db_table_type, fields)
+    if where:
+        statement = statement.where(*where)
+    if order_by:
+        statement = statement.order_by(*order_by)
+    params = {"offset": offset, "limit": limit}
+    if fields is not None:
+        res = await session.execute(statement, params)
+        return [dict(row) for row in res.mappings()]
+    res = await session.exec(statement, params=params)  # type: ignore
     return list(res.all())
 
 
-async def get_by_id(
-    _id: int, session: AsyncSession, db_table_type: type[IntBasicModel]
-) -> SQLModel:
-    return await get_first_where(
-        session,
-        db_table_type,
-        db_table_type.id == _id,
-        f"ID={_id} doesn't exist for table={db_table_type.__name__}",
+async def stream_all(
+    db_table_type: type[SQLModel], batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[list[SQLModel]]:
+    """Yields whole table in batches through a server side cursor,
+    owns its session so it can outlive the request handler"""
+    pk_columns = db_table_type.__table__.primary_key.columns  # type: ignore
+    statement = (
+        select(db_table_type)
+        .order_by(*pk_columns)
+        .execution_options(yield_per=batch_size)
     )
+    async with read_session() as session:  # type: ignore
+        res = await session.stream_scalars(statement)
+        async for batch in res.partitions():
+            yield list(batch)
+
+
+def encode_cursor(values: list[Any]) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def is_string(column: Column) -> bool:
+    # sqlmodel AutoString is a decorator over String
+    return isinstance(getattr(column.type, "impl_instance", column.type), String)
+
+
+def python_type(column: Column) -> Any:
+    try:
+        return column.type.python_type
+    except NotImplementedError:  # e.g. sqlmodel AutoString
+        return str if is_string(column) else Any
+
+
+def decode_cursor(cursor: str, columns: list[Column]) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor length mismatch")
+        return [
+            TypeAdapter(python_type(column)).validate_python(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, ValidationError) as e:
+        raise exceptions.BadRequest(detail="Invalid cursor") from e
+
+
+def get_keyset_columns(db_table_type: type[SQLModel], sort_by: str) -> list[Column]:
+    """Sort column followed by primary key, so keyset order is always unique"""
+    table = db_table_type.__table__  # type: ignore
+    sort_column = table.c[sort_by]
+    if sort_column.unique or sort_column.primary_key:
+        return [sort_column]
+    pk_columns = [c for c in table.primary_key.columns if c is not sort_column]
+    return [sort_column, *pk_columns]
+
+
+def get_filter_operators(
+    db_table_type: type[SQLModel], allow_unindexed: bool = False
+) -> dict[str, set[str]]:
+    """Filter operators per column. Only those an index can serve by default,
+    so no client filter turns into a sequential scan"""
+    table = db_table_type.__table__  # type: ignore
+    btree = {"eq", "in", "gte", "lte"}
+    if allow_unindexed:
+        return {
+            column.key: set(FILTER_OPERATORS if is_string(column) else btree)
+            for column in table.columns
+        }
+
+    operators: dict[str, set[str]] = {}
+    # only the leading column of a multi column index can be searched by itself
+    leading = [list(table.primary_key.columns)]
+    leading += [
+        list(constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    ]
+    for columns in leading:
+        if columns:
+            operators.setdefault(columns[0].key, set()).update(btree)
+    for index in table.indexes:
+        columns = list(index.columns)
+        if not columns:  # expression index
+            continue
+        options = index.dialect_options["postgresql"]
+        if options["where"] is not None:  # partial index serves only its own filter
+            continue
+        column = columns[0]
+        using = options["using"] or "btree"
+        if using == "hash":
+            operators.setdefault(column.key, set()).update({"eq", "in"})
+        elif using == "btree":
+            column_operators = operators.setdefault(column.key, set())
+            ops = (options["ops"] or {}).get(column.key)
+            if ops in PATTERN_OPS:
+                # serves equality and LIKE, but not ranges or order of the collation
+                column_operators.update({"eq", "in", "prefix"})
+                continue
+            column_operators.update(btree)
+            if getattr(column.type, "collation", None) == "C":
+                column_operators.add("prefix")
+    return operators
+
+
+def build_filters(
+    db_table_type: type[SQLModel], values: dict[str, Any]
+) -> list[ColumnElement[bool]]:
+    """`values` are keyed by `column` or `column__operator`, None values are skipped"""
+    columns = db_table_type.__table__.c  # type: ignore
+    conditions = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        name, _, operator = key.partition("__")
+        column = columns[name]
+        if operator == "in":
+            conditions.append(column.in_(value))
+        elif operator == "gte":
+            conditions.append(column >= value)
+        elif operator == "lte":
+            conditions.append(column <= value)
+        elif operator == "prefix":
+            # constant pattern, so the planner can turn it into an index range
+            escaped = value.replace("/", "//").replace("%", "/%").replace("_", "/_")
+            conditions.append(column.like(f"{escaped}%", escape="/"))
+        else:
+            conditions.append(column == value)
+    return conditions
+
+
+def build_order_by(db_table_type: type[SQLModel], sort: str) -> list[ColumnElement]:
+    """`sort` is a column name, `-column` for descending order.
+    Primary key is added so the order is always unique"""
+    table = db_table_type.__table__  # type: ignore
+    descending = sort.startswith("-")
+    sort_column = table.c[sort.removeprefix("-")]
+    columns = [sort_column]
+    if not (sort_column.unique or sort_column.primary_key):
+        columns += [c for c in table.primary_key.columns if c is not sort_column]
+    return [c.desc() if descending else c.asc() for c in columns]
+
+
+async def get_page_after(
+    session: AsyncSession,
+    db_table_type: type[SQLModel],
+    cursor: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    sort_by: str = "id",
+    fields: tuple[str, ...] | None = None,
+    where: list[ColumnElement[bool]] | None = None,
+) -> tuple[list[SQLModel] | list[dict[str, Any]], str | None]:
+    """Keyset pagination, returns page items and cursor for the next page.
+
+    Seeks straight to the cursor through the index, so deep pages cost the same
+    as the first one. With `fields` items are dicts, which also hold keyset columns.
+    """
+    columns = get_keyset_columns(db_table_type, sort_by)
+    if fields is not None:
+        fields = (*fields, *(c.key for c in columns if c.key not in fields))
+    statement = statements.select_fields(db_table_type, fields)
+    statement = statement.order_by(*columns).limit(limit)
+    if where:
+        statement = statement.where(*where)
+    if cursor is not None:
+        values = decode_cursor(cursor, columns)
+        statement = statement.where(tuple_(*columns) > tuple_(*values))
+    if fields is not None:
+        res = await session.execute(statement)
+        items: list = [dict(row) for row in res.mappings()]
+    else:
+        res = await session.exec(statement)  # type: ignore
+        items = list(res.all())
+
+    next_cursor = None
+    if items and len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            [
+                last[c.key] if isinstance(last, dict) else getattr(last, c.key)
+                for c in columns
+            ]
+        )
+    return items, next_cursor
+
+
+async def count(
+    session: AsyncSession,
+    db_table_type: type[SQLModel],
+    estimate: bool = False,
+    where: list[ColumnElement[bool]] | None = None,
+) -> int:
+    """Counts table rows, `estimate` reads planner statistics instead of scanning,
+    which is only possible for the whole table"""
+    if estimate and not where:
+        statement = text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"
+        )
+        res = await session.execute(
+            statement, {"name": db_table_type.__tablename__}  # type: ignore
+        )
+        estimated = res.scalar()
+        # reltuples is -1 until table is vacuumed or analyzed for the first time
+        if estimated is not None and estimated >= 0:
+            return int(estimated)
+    statement = select(func.count()).select_from(db_table_type)
+    if where:
+        statement = statement.where(*where)
+    res = await session.exec(statement)
+    return res.one()
+
+
+async def get_by_id(
+    _id: int,
+    session: AsyncSession,
+    db_table_type: type[IntBasicModel],
+    fields: tuple[str, ...] | None = None,
+) -> SQLModel | dict[str, Any]:
+    """Whole entity, or only `fields` columns as dict"""
+    statement = statements.select_where_equals(db_table_type, "id", fields)
+    if fields is not None:
+        res = await session.execute(statement, {"value": _id})
+        row = res.mappings().first()
+        item = None if row is None else dict(row)
+    else:
+        res = await session.exec(statement, params={"value": _id})  # type: ignore
+        item = res.first()
+    if item is None:
+        raise exceptions.NotFound(
+            detail=f"ID={_id} doesn't exist for table={db_table_type.__name__}"
+        )
+    return item
+
+
+get_by_id_flight = SingleFlight()
+
+
+async def get_by_id_shared(
+    _id: int,
+    db_table_type: type[IntBasicModel],
+    use_primary: bool = False,
+    fields: tuple[str, ...] | None = None,
+) -> SQLModel | dict[str, Any]:
+    """Same as `get_by_id`, but concurrent lookups of the same row share one query,
+    which runs in its own session so no caller's session outlives its request"""
+
+    async def load() -> SQLModel | dict[str, Any]:
+        async with read_session(use_primary) as session:  # type: ignore
+            return await get_by_id(_id, session, db_table_type, fields)
+
+    key = (db_table_type, _id, use_primary, fields)
+    return await get_by_id_flight.do(key, load)
 
 
 async def get_first_where(
@@ -75,11 +486,20 @@ async def get_first_where(
 
 
 async def delete_by_id(
-    _id: int, session: AsyncSession, db_table_type: type[SQLModel]
+    _id: int, session: AsyncSession, db_table_type: type[IntBasicModel]
 ) -> SQLModel:
-    item = await get_by_id(_id, session, db_table_type)
-    await session.delete(item)
-    await session.commit()
+    stmt = (
+        delete(db_table_type)
+        .where(db_table_type.id == _id)  # type: ignore
+        .returning(db_table_type)
+        .execution_options(synchronize_session=False)
+    )
+    # rows still referenced by foreign keys fail with Conflict
+    item = await _write_returning(stmt, session, db_table_type, _id)
+    if item is None:
+        raise exceptions.NotFound(
+            detail=f"ID={_id} doesn't exist for table={db_table_type.__name__}"
+        )
     return item
 
 
@@ -87,31 +507,223 @@ async def update_by_id(
     _id: int,
     session: AsyncSession,
     data: SQLModel,
-    db_table_type: type[SQLModel],
+    db_table_type: type[IntBasicModel],
 ) -> SQLModel:
-    item = await get_by_id(_id, session, db_table_type)
-    new_item = db_utils.update_partially(item, data)
-    session.add(new_item)
-    await session.commit()
-    await session.refresh(new_item)
-    return new_item
+    values = db_utils.get_update_values(data)
+    if not values:
+        return await get_by_id(_id, session, db_table_type)
+    stmt = (
+        update(db_table_type)
+        .where(db_table_type.id == _id)  # type: ignore
+        .values(**values)
+        .returning(db_table_type)
+        .execution_options(synchronize_session=False)
+    )
+    item = await _write_returning(stmt, session, db_table_type, _id)
+    if item is None:
+        raise exceptions.NotFound(
+            detail=f"ID={_id} doesn't exist for table={db_table_type.__name__}"
+        )
+    return item
 
 
 async def create(
     item: SQLModel, session: AsyncSession, db_table_type: type[SQLModel]
 ) -> SQLModel:
+    stmt = (
+        insert(db_table_type)
+        .values(**db_utils.get_insert_values(item, db_table_type))
+        .returning(db_table_type)
+    )
+    return await _write_returning(stmt, session, db_table_type, inserted=True)  # type: ignore
+
+
+async def _write_returning(
+    stmt: Executable,
+    session: AsyncSession,
+    db_table_type: type[SQLModel],
+    _id: int | None = None,
+    inserted: bool = False,
+) -> SQLModel | None:
+    """Runs single write statement with RETURNING, publishes invalidation
+    of the row (or the whole table if `_id` is not given) and commits it"""
+    stmt = invalidation.publishing(
+        stmt,  # type: ignore
+        db_table_type,
+        db_table_type.__tablename__,
+        None if _id is None else "id",
+        _id,
+        inserted,
+    )
     try:
-        new_item = db_table_type(**item.dict())
-        session.add(new_item)
+        res = await session.scalars(stmt)
+        item = res.first()
         await session.commit()
-        await session.refresh(new_item)
-        return new_item
+        return item
     except IntegrityError as e:
+        await session.rollback()
         raise exceptions.Conflict(
             detail=f"Integrity error.{db_utils.parse_integrity_error(str(e))}"
         )
 
 
+async def bulk_create(
+    items: list[SQLModel], session: AsyncSession, db_table_type: type[SQLModel]
+) -> tuple[list[SQLModel], dict[int, str]]:
+    """Inserts items with one multi-row INSERT ... RETURNING in one transaction.
+
+    On integrity error items are retried one by one in savepoints, so valid ones
+    are still created and errors are returned by item index.
+    """
+    rows = [db_utils.get_insert_values(item, db_table_type) for item in items]
+    stmt = insert(db_table_type).returning(db_table_type, sort_by_parameter_order=True)
+    try:
+        res = await session.scalars(stmt, rows)
+        created = list(res.all())
+        await invalidation.publish(
+            session, db_table_type.__tablename__, inserted=True
+        )
+        await session.commit()
+        return created, {}
+    except IntegrityError:
+        await session.rollback()
+    return await _write_per_item(
+        session,
+        db_table_type,
+        [insert(db_table_type).values(**row).returning(db_table_type) for row in rows],
+        inserted=True,
+    )
+
+
+async def bulk_update(
+    items: list[IntBasicModel],
+    session: AsyncSession,
+    db_table_type: type[IntBasicModel],
+) -> tuple[list[SQLModel], dict[int, str]]:
+    """Partially updates items by id in one transaction, with one Core executemany
+    per set of sent columns. Unlike ORM bulk update it doesn't check rowcount,
+    missing ids are found when updated rows are read back"""
+    errors: dict[int, str] = {}
+    rows: dict[int, tuple[int, dict[str, Any]]] = {}
+    for index, item in enumerate(items):
+        if item.id is None:
+            errors[index] = "ID is required"
+        else:
+            rows[index] = (item.id, db_utils.get_update_values(item))
+
+    table = db_table_type.__table__  # type: ignore
+    groups: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+    for _id, values in rows.values():
+        if values:
+            groups.setdefault(tuple(sorted(values)), []).append({**values, "_id": _id})
+    try:
+        for columns, params in groups.items():
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values({column: bindparam(column) for column in columns})
+            )
+            await session.execute(stmt, params)
+        ids = [_id for _id, _ in rows.values()]
+        # event is queued by the select reading updated rows back
+        res = await session.scalars(
+            select(db_table_type, invalidation.notify(db_table_type.__tablename__))
+            .where(db_table_type.id.in_(ids))  # type: ignore
+            .execution_options(populate_existing=True)
+        )
+        found = {item.id: item for item in res.all()}
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        updated, item_errors = await _write_per_item(
+            session,
+            db_table_type,
+            [
+                update(db_table_type)
+                .where(db_table_type.id == _id)  # type: ignore
+                .values(**values)
+                .returning(db_table_type)
+                if values
+                else select(db_table_type).where(db_table_type.id == _id)  # type: ignore
+                for _id, values in rows.values()
+            ],
+        )
+        indexes = list(rows)
+        errors.update({indexes[i]: msg for i, msg in item_errors.items()})
+        return updated, errors
+
+    updated = []
+    for index, (_id, _) in rows.items():
+        if _id in found:
+            updated.append(found[_id])
+        else:
+            errors[index] = f"ID={_id} doesn't exist"
+    return updated, errors
+
+
+async def bulk_delete(
+    ids: list[int], session: AsyncSession, db_table_type: type[IntBasicModel]
+) -> tuple[list[SQLModel], dict[int, str]]:
+    """Deletes items with one DELETE ... RETURNING in one transaction"""
+    stmt = (
+        delete(db_table_type)
+        .where(db_table_type.id.in_(ids))  # type: ignore
+        .returning(db_table_type)
+        .execution_options(synchronize_session=False)
+    )
+    stmt = invalidation.publishing(stmt, db_table_type, db_table_type.__tablename__)
+    try:
+        res = await session.scalars(stmt)
+        deleted = {item.id: item for item in res.all()}
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return await _write_per_item(
+            session,
+            db_table_type,
+            [
+                delete(db_table_type)
+                .where(db_table_type.id == _id)  # type: ignore
+                .returning(db_table_type)
+                .execution_options(synchronize_session=False)
+                for _id in ids
+            ],
+        )
+
+    errors = {
+        index: f"ID={_id} doesn't exist"
+        for index, _id in enumerate(ids)
+        if _id not in deleted
+    }
+    return [deleted[_id] for _id in dict.fromkeys(ids) if _id in deleted], errors
+
+
+async def _write_per_item(
+    session: AsyncSession,
+    db_table_type: type[SQLModel],
+    statements: list[Executable],
+    inserted: bool = False,
+) -> tuple[list[SQLModel], dict[int, str]]:
+    """Runs each write with RETURNING in its own savepoint of one transaction"""
+    items: list[SQLModel] = []
+    errors: dict[int, str] = {}
+    for index, stmt in enumerate(statements):
+        try:
+            async with session.begin_nested():
+                res = await session.scalars(stmt)
+                item = res.first()
+        except IntegrityError as e:
+            errors[index] = f"Integrity error.{db_utils.parse_integrity_error(str(e))}"
+            continue
+        if item is None:
+            errors[index] = "Item doesn't exist"
+        else:
+            items.append(item)
+    await invalidation.publish(session, db_table_type.__tablename__, inserted=inserted)
+    await session.commit()
+    return items, errors
+
+
 async def upsert(
     item: IntBasicModel,
     session: AsyncSession,
@@ -122,7 +734,10 @@ async def upsert(
         insert(db_table_type)
         .values(**item.model_dump())
         .on_conflict_do_update(index_elements=index_elements, set_=item.model_dump())
+        .returning(db_table_type)
+    )
+    await session.execute(
+        invalidation.publishing(stmt, db_table_type, db_table_type.__tablename__)
     )
-    await session.exec(stmt)
     await session.commit()
     return item
@@ -1,13 +1,28 @@
+from typing import Any
+
 from sqlmodel import SQLModel
 
 
-def update_partially(item: SQLModel, new_data: SQLModel) -> SQLModel:
-    new_data_dict = new_data.model_dump(
+def get_update_values(new_data: SQLModel) -> dict[str, Any]:
+    """Only fields client actually sent, for partial update.
+    Primary keys are never updated, they only identify the row"""
+    values = new_data.model_dump(
         exclude_defaults=True, exclude_none=True, exclude_unset=True
     )
-    item_dict = item.model_dump()
-    item_dict.update(**new_data_dict)
-    return item.copy(update=item_dict)
+    table = getattr(type(new_data), "__table__", None)
+    if table is not None:
+        for column in table.primary_key.columns:
+            values.pop(column.key, None)
+    return values
+
+
+def get_insert_values(item: SQLModel, db_table_type: type[SQLModel]) -> dict[str, Any]:
+    """Item fields without empty primary keys, so database generates them"""
+    values = item.model_dump()
+    for column in db_table_type.__table__.primary_key.columns:  # type: ignore
+        if values.get(column.key) is None:
+            values.pop(column.key, None)
+    return values
 
 
 def parse_integrity_error(err: str) -> str:
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable
+
+import asyncpg
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.functions import Function
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+CHANNEL = "cache_invalidation"
+KEEPALIVE_SECONDS = 30
+RECONNECT_SECONDS = 5
+
+# handler gets column and key of changed row, or None and None if whole table changed,
+# and whether rows were only inserted, which can't make cached ones stale
+Handler = Callable[[str | None, Any, bool], None]
+
+handlers: dict[str, list[Handler]] = defaultdict(list)
+
+logger = logging.getLogger("invalidation")
+
+
+def subscribe(table: str, handler: Handler) -> None:
+    handlers[table].append(handler)
+
+
+def notify(
+    table: str, column: str | None = None, key: Any = None, inserted: bool = False
+) -> Function:
+    payload = json.dumps(
+        {"table": table, "column": column, "key": key, "inserted": inserted}
+    )
+    return func.pg_notify(CHANNEL, payload)
+
+
+async def publish(
+    session: AsyncSession,
+    table: str,
+    column: str | None = None,
+    key: Any = None,
+    inserted: bool = False,
+) -> None:
+    """Queues event in the session transaction, Postgres delivers it
+    to every listening worker only when the transaction commits"""
+    await session.execute(select(notify(table, column, key, inserted)))
+
+
+def publishing(
+    stmt: UpdateBase,
+    entity: Any,
+    table: str,
+    column: str | None = None,
+    key: Any = None,
+    inserted: bool = False,
+) -> Select:
+    """Same as `publish`, but without a round trip of its own: write with
+    RETURNING `entity` runs as a CTE and the event is queued by the select
+    reading its rows, so only if the write changed anything"""
+    written = stmt.cte("written")
+    return (
+        select(aliased(entity, written), notify(table, column, key, inserted))
+        # as DML with RETURNING does, refreshes rows already in the session
+        .execution_options(populate_existing=True)
+    )
+
+
+def dispatch(
+    table: str, column: str | None = None, key: Any = None, inserted: bool = False
+) -> None:
+    for handler in handlers.get(table, []):
+        try:
+            handler(column, key, inserted)
+        except Exception as e:
+            logger.error(f"Error invalidating {table=}, {column=}, {key=}: {e}")
+
+
+def dispatch_all() -> None:
+    for table in list(handlers):
+        dispatch(table)
+
+
+def _on_notification(connection: Any, pid: int, channel: str, payload: str) -> None:
+    event = json.loads(payload)
+    # events from workers still running older code have no "inserted"
+    dispatch(event["table"], event["column"], event["key"], event.get("inserted", False))
+
+
+async def listen(dsn: str) -> None:
+    """Keeps one listener connection per worker and evicts local caches
+    on events from every worker, started from app lifespan"""
+    while True:
+        try:
+            connection = await asyncpg.connect(dsn)
+        except Exception as e:
+            logger.error(f"Error connecting cache invalidation listener: {e}")
+            await asyncio.sleep(RECONNECT_SECONDS)
+            continue
+        try:
+            await connection.add_listener(CHANNEL, _on_notification)
+            # events published while disconnected are lost, so nothing cached is trusted
+            dispatch_all()
+            while True:
+                await asyncio.sleep(KEEPALIVE_SECONDS)
+                await connection.execute("SELECT 1")
+        except Exception as e:
+            logger.error(f"Cache invalidation listener lost connection: {e}")
+        finally:
+            connection.terminate()
+        await asyncio.sleep(RECONNECT_SECONDS)
@@ -0,0 +1,46 @@
+"""Migrations are applied once per deploy by `bootstrap.py`,
+app workers only check that the database is at the revision they expect"""
+
+import logging
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from alembic.util import CommandError
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from database.crud import engine
+
+
+ALEMBIC_CONFIG = "alembic.ini"
+
+logger = logging.getLogger("schema")
+
+
+async def get_current_revision() -> str | None:
+    try:
+        async with engine.connect() as connection:
+            res = await connection.execute(text("SELECT version_num FROM alembic_version"))
+            return res.scalar()
+    except ProgrammingError:  # no migrations applied yet
+        return None
+
+
+async def check_version() -> None:
+    """Raises if database is behind this code. Only warns if it is ahead,
+    which happens to old workers restarted during a rolling deploy"""
+    script = ScriptDirectory.from_config(Config(ALEMBIC_CONFIG))
+    head = script.get_current_head()
+    current = await get_current_revision()
+    if current == head:
+        return
+    try:
+        is_known = current is None or script.get_revision(current) is not None
+    except CommandError:  # unknown revision
+        is_known = False
+    if is_known:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}, "
+            "run `python bootstrap.py` first"
+        )
+    logger.warning(f"Database schema revision {current} is newer than {head}")
@@ -0,0 +1,45 @@
+"""Per model statements built once and reused with bound parameters.
+
+Building `select()` and its cache key costs more than looking up compiled SQL,
+prebuilt statements memoize their cache key, so hot queries skip both.
+Client supplied `fields` are part of the key, so the caches are bounded.
+"""
+
+from functools import lru_cache
+
+from sqlalchemy import bindparam
+from sqlmodel import SQLModel, select
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+
+def select_fields(
+    db_table_type: type[SQLModel], fields: tuple[str, ...] | None = None
+) -> Select | SelectOfScalar:
+    """Whole entities, or only `fields` columns which are read as mappings"""
+    if fields is None:
+        return select(db_table_type)
+    table = db_table_type.__table__  # type: ignore
+    return select(*(table.c[name] for name in fields))
+
+
+@lru_cache(maxsize=256)
+def select_where_equals(
+    db_table_type: type[SQLModel],
+    column_name: str,
+    fields: tuple[str, ...] | None = None,
+) -> Select | SelectOfScalar:
+    """Executed with `params={"value": ...}`"""
+    column = getattr(db_table_type, column_name)
+    return select_fields(db_table_type, fields).where(column == bindparam("value"))
+
+
+@lru_cache(maxsize=256)
+def select_page(
+    db_table_type: type[SQLModel], fields: tuple[str, ...] | None = None
+) -> Select | SelectOfScalar:
+    """Executed with `params={"offset": ..., "limit": ...}`"""
+    return (
+        select_fields(db_table_type, fields)
+        .offset(bindparam("offset"))  # type: ignore
+        .limit(bindparam("limit"))  # type: ignore
+    )
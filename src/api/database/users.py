@@ -1,10 +1,37 @@
 from typing import Optional
 from fastapi import HTTPException
-from sqlmodel import select, update
+from sqlmodel import delete, func, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from tables.user import User
-from database import crud
+from tables.auth import ResetPasswordCode
+from database import crud, invalidation, statements
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
+import settings
+
+
+user_cache: TTLCache[str, User] = TTLCache(
+    settings.auth.USER_CACHE_SIZE, settings.auth.USER_CACHE_TTL_SECONDS
+)
+user_flight = SingleFlight()
+
+
+def _on_user_changed(column: str | None, key: str | None, inserted: bool) -> None:
+    if inserted:  # only found users are cached, a new one can't be stale
+        return
+    # generic crud writes are keyed by id, which user_cache doesn't know
+    invalidate_user(key if column == "username" else None)
+
+
+invalidation.subscribe(User.__tablename__, _on_user_changed)
+
+
+def get_hot_statements() -> list:
+    """Queries run on almost every request, prepared on pool warm up"""
+    return [
+        statements.select_where_equals(User, "username").params(value=""),
+    ]
 
 
 async def get_user_by_username(
@@ -12,11 +39,53 @@ async def get_user_by_username(
 ) -> Optional[User]:
     if username is None:
         return
-    statement = select(User).where(User.username == username)
-    res = await session.exec(statement)
+    res = await session.exec(
+        statements.select_where_equals(User, "username"),
+        params={"value": username},
+    )
     return res.first()
 
 
+async def get_cached_user_by_username(username: str | None) -> Optional[User]:
+    """Same as `get_user_by_username`, but served from `user_cache` when possible"""
+    if username is None:
+        return
+    user = user_cache.get(username)
+    if user is None:
+        user = await user_flight.do(username, lambda: _load_user(username))
+    return user
+
+
+async def _load_user(username: str) -> Optional[User]:
+    async with crud.read_session() as session:  # type: ignore
+        user = await get_user_by_username(username, session)
+    if user is not None:
+        user_cache.set(username, user)
+    return user
+
+
+def invalidate_user(username: str | None = None) -> None:
+    """Drops cached user, or the whole cache if `username` is not given"""
+    if username is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(username)
+
+
+async def broadcast_user_changed(username: str | None = None) -> None:
+    """Drops user from cache in this and every other worker,
+    for writes made outside of this module"""
+    invalidate_user(username)
+    async with crud.async_session() as session:  # type: ignore
+        await invalidation.publish(
+            session,
+            User.__tablename__,
+            None if username is None else "username",
+            username,
+        )
+        await session.commit()
+
+
 async def create_user_if_not_exists(
     username: str, hashed_password: str, session: AsyncSession
 ) -> User:
@@ -26,15 +95,62 @@ async def create_user_if_not_exists(
 
 
 async def update_user_password(
-    username: str, new_hashed_password: str, session: AsyncSession
+    username: str,
+    new_hashed_password: str,
+    session: AsyncSession,
+    old_hashed_password: str | None = None,
 ) -> None:
+    """Sets new password hash, if `old_hashed_password` is given
+    updates only while it is still the current one"""
     stmt = (
         update(User)
         .where(User.username == username)
         .values(hashed_password=new_hashed_password)
+        .returning(User)
+    )
+    if old_hashed_password is not None:
+        stmt = stmt.where(User.hashed_password == old_hashed_password)
+    await session.execute(
+        invalidation.publishing(stmt, User, User.__tablename__, "username", username)
+    )
+    await session.commit()
+    invalidate_user(username)
+
+
+async def reset_password_with_code(
+    username: str,
+    hashed_code: str,
+    new_hashed_password: str,
+    max_attempts: int,
+    session: AsyncSession,
+) -> bool:
+    """Consumes valid reset code and sets new password in one statement,
+    returns False if code is wrong, expired or out of attempts"""
+    consumed = (
+        delete(ResetPasswordCode)
+        .where(
+            ResetPasswordCode.username == username,
+            ResetPasswordCode.hashed_code == hashed_code,
+            ResetPasswordCode.expires > func.now(),
+            ResetPasswordCode.attempts <= max_attempts,
+        )
+        .returning(ResetPasswordCode.username)
+        .cte("consumed")
+    )
+    stmt = (
+        update(User)
+        .where(User.username == consumed.c.username)
+        .values(hashed_password=new_hashed_password)
+        .returning(User)
+    )
+    res = await session.execute(
+        invalidation.publishing(stmt, User, User.__tablename__, "username", username)
     )
-    await session.exec(stmt)
+    is_updated = res.first() is not None
     await session.commit()
+    if is_updated:
+        invalidate_user(username)
+    return is_updated
 
 
 async def create_superuser(username: str, hashed_password: str, session: AsyncSession):
@@ -41,3 +41,17 @@ class InternalServerError(HTTPException):
         self, detail: str | None = None, headers: dict[str, str] | None = None
     ) -> None:
         super().__init__(status.HTTP_500_INTERNAL_SERVER_ERROR, detail, headers)
+
+
+class ServiceUnavailable(HTTPException):
+    def __init__(
+        self, detail: str | None = None, headers: dict[str, str] | None = None
+    ) -> None:
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, detail, headers)
+
+
+class TooManyRequests(HTTPException):
+    def __init__(
+        self, detail: str | None = None, headers: dict[str, str] | None = None
+    ) -> None:
+        super().__init__(status.HTTP_429_TOO_MANY_REQUESTS, detail, headers)
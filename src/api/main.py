@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 import uvicorn
@@ -9,16 +10,23 @@ from starlette_admin.i18n import I18nConfig
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware import Middleware
 from starlette.middleware.sessions import SessionMiddleware
-from alembic.command import upgrade
-from alembic.config import Config
 
 from routes import api
-from database.crud import engine, async_session
+from database import crud
+from database.crud import engine
 from database import users
+from database import invalidation
+from database import schema
 from admin import UserView
 from tables.user import User
-from services import auth_service
 from services import admin_auth_provider
+from services import hashing_service
+from services import sweeper_service
+from services import stats_service
+from services import email_service
+from services import job_service
+from utils.middlewares import ReadYourWritesMiddleware
+import bootstrap
 import settings
 
 
@@ -30,17 +38,26 @@ else:
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    if not settings.env.IS_TEST:
-        upgrade(Config("alembic.ini"), revision="head")
-        async with async_session() as session:
-            await users.create_superuser(
-                settings.env.SUPERUSER_USERNAME,
-                auth_service.get_password_hash(settings.env.SUPERUSER_PASSWORD),
-                session,
-            )
+    if settings.db.MIGRATE_ON_STARTUP:
+        await bootstrap.run()
+    elif not settings.env.IS_TEST:
+        await schema.check_version()
+    await crud.warm_up(users.get_hot_statements())
+    background = [
+        asyncio.create_task(sweeper_service.run()),
+        asyncio.create_task(stats_service.run()),
+        asyncio.create_task(invalidation.listen(crud.get_listen_dsn())),
+    ]
+    if settings.jobs.JOBS_IN_APP:
+        background.extend(job_service.start_workers())
     yield
 
     logging.info("shutdown FastAPI...")  # shutdown
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await email_service.smtp_pool.close()
+    hashing_service.pool.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -48,6 +65,8 @@ app.include_router(api)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+if settings.db.POSTGRES_REPLICA_HOSTS:  # nothing to pin reads to otherwise
+    app.add_middleware(ReadYourWritesMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -1,15 +1,16 @@
-from fastapi import BackgroundTasks, Depends, APIRouter, status
+from fastapi import Depends, APIRouter, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from schemas.token import Token
+from schemas.token import Token, TokenRefresh
 from schemas.responses import Status
 from schemas.user_schema import UserOut
 from schemas.http_error import HTTPError
 from schemas.reset_password_schema import ResetPassword, SendEmailCode
-from services import auth_service
+from services import auth_service, rate_limit_service
 from database import users, crud
 from utils import docs
+from utils.fast_json import FastJSONResponse
 import exceptions
 
 
@@ -18,69 +19,126 @@ router = APIRouter(prefix="/auth", tags=["Аутентификация"])
 
 @router.post(
     "/login",
+    response_model=Token,
     description=docs.create("Входит по логину и паролю или возвращает новый токен"),
     responses={
         **HTTPError.get_docs(status.HTTP_401_UNAUTHORIZED),
+        **HTTPError.get_docs(status.HTTP_429_TOO_MANY_REQUESTS),
         **HTTPError.get_docs(status.HTTP_500_INTERNAL_SERVER_ERROR),
+        **HTTPError.get_docs(status.HTTP_503_SERVICE_UNAVAILABLE),
     },
 )
-async def login(user_data: OAuth2PasswordRequestForm = Depends()) -> Token:
+async def login(
+    request: Request, user_data: OAuth2PasswordRequestForm = Depends()
+) -> FastJSONResponse:
+    await rate_limit_service.check("login", request, user_data.username)
     token = await auth_service.process_token(user_data)
     if not token:
         raise exceptions.InternalServerError(detail="Invalid user data")
-    return token
+    return FastJSONResponse(token)
+
+
+@router.post(
+    "/refresh",
+    response_model=Token,
+    description=docs.create(
+        "Возвращает новый токен по refresh токену",
+        notes=["Refresh токен одноразовый, в ответе приходит новый"],
+    ),
+    responses={**HTTPError.get_docs(status.HTTP_401_UNAUTHORIZED)},
+)
+async def refresh(
+    body: TokenRefresh,
+    session: AsyncSession = Depends(crud.get_async_session),
+) -> FastJSONResponse:
+    token = await auth_service.rotate_refresh_token(body.refresh_token, session)
+    return FastJSONResponse(token)
+
+
+@router.post(
+    "/logout",
+    response_model=Status,
+    description=docs.create("Отзывает refresh токен"),
+)
+async def logout(
+    body: TokenRefresh,
+    session: AsyncSession = Depends(crud.get_async_session),
+) -> FastJSONResponse:
+    await auth_service.revoke_refresh_tokens(session, refresh_token=body.refresh_token)
+    return FastJSONResponse(Status(status=True, detail="Refresh token revoked"))
 
 
 @router.post(
     "/register",
+    response_model=UserOut,
     description=docs.create("Регистрирует нового пользователя"),
-    responses={**HTTPError.get_docs(status.HTTP_409_CONFLICT)},
+    responses={
+        **HTTPError.get_docs(status.HTTP_409_CONFLICT),
+        **HTTPError.get_docs(status.HTTP_429_TOO_MANY_REQUESTS),
+        **HTTPError.get_docs(status.HTTP_503_SERVICE_UNAVAILABLE),
+    },
 )
 async def register(
+    request: Request,
     user_data: OAuth2PasswordRequestForm = Depends(),
     session: AsyncSession = Depends(crud.get_async_session),
-) -> UserOut:
-    return await users.create_user_if_not_exists(
-        user_data.username, auth_service.get_password_hash(user_data.password), session
+) -> FastJSONResponse:
+    await rate_limit_service.check("register", request, user_data.username)
+    user = await users.create_user_if_not_exists(
+        user_data.username,
+        await auth_service.ahash_password(user_data.password),
+        session,
     )
+    # explicit conversion, serializing User as UserOut would leak password hash
+    return FastJSONResponse(UserOut.model_validate(user, from_attributes=True))
 
 
 @router.post(
     "/password/reset",
+    response_model=Status,
     description=docs.create(
         "Меняет пароль пользователя на новый",
         notes=[
             "Меняет только при условии что отправленный в ```body``` код верный и его срок действия не истек",
             "Если пользователь не существует - возвращается ошибка",
+            "Все refresh токены пользователя отзываются",
         ],
     ),
     responses={
         **HTTPError.get_docs(status.HTTP_400_BAD_REQUEST),
         **HTTPError.get_docs(status.HTTP_404_NOT_FOUND),
+        **HTTPError.get_docs(status.HTTP_429_TOO_MANY_REQUESTS),
     },
 )
 async def reset_password(
+    request: Request,
     body: ResetPassword,
     session: AsyncSession = Depends(crud.get_async_session),
-) -> Status:
-    # don't need to check result, because if code is wrong it returns error
-    _ = await auth_service.verify_reset_password_code(body.username, body.code, session)
-    await users.update_user_password(
-        body.username, auth_service.get_password_hash(body.new_password), session
+) -> FastJSONResponse:
+    await rate_limit_service.check("reset_password", request, body.username)
+    await auth_service.reset_password(
+        body.username, body.code, body.new_password, session
+    )
+    await auth_service.revoke_refresh_tokens(session, username=body.username)
+    return FastJSONResponse(
+        Status(status=True, detail="User password updated successfully")
     )
-    return Status(status=True, detail="User password updated successfully")
 
 
 @router.post(
     "/password/send_code",
+    response_model=Status,
     description=docs.create("Отправляет код на почту пользователя"),
-    responses={**HTTPError.get_docs(status.HTTP_404_NOT_FOUND)},
+    responses={
+        **HTTPError.get_docs(status.HTTP_404_NOT_FOUND),
+        **HTTPError.get_docs(status.HTTP_429_TOO_MANY_REQUESTS),
+    },
 )
 async def send_reset_password_code(
+    request: Request,
     body: SendEmailCode,
-    bg_tasks: BackgroundTasks,
     session: AsyncSession = Depends(crud.get_async_session),
-):
-    return await auth_service.create_reset_password_code(
-        str(body.username), session, bg_tasks
-    )
+) -> FastJSONResponse:
+    await rate_limit_service.check("send_code", request, str(body.username))
+    await auth_service.create_reset_password_code(str(body.username), session)
+    return FastJSONResponse(Status(status=True, detail="Code sent"))
@@ -1,6 +1,7 @@
+from functools import lru_cache
 from typing import Generic, TypeVar
 
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 
 
 T = TypeVar("T")
@@ -19,3 +20,30 @@ class PaginatedItems(Items, Generic[T]):
     page_index: int = 0
     page_size: int = 0
     total_pages: int = 0
+    total: int | None = None
+    next_cursor: str | None = None
+
+
+class ItemError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkItems(Items, Generic[T]):
+    errors: list[ItemError] = []
+
+    @classmethod
+    def from_result(cls, items: list, errors: dict[int, str]) -> "BulkItems":
+        return cls(
+            items=items,
+            errors=[ItemError(index=i, detail=msg) for i, msg in sorted(errors.items())],
+        )
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """Model with only `fields` of `model`, built once per field set"""
+    return create_model(  # type: ignore
+        f"{model.__name__}Partial",
+        **{name: (model.model_fields[name].annotation, ...) for name in fields},
+    )
@@ -1,5 +1,6 @@
 from datetime import timedelta
 import logging
+import time
 from typing import Optional, Sequence
 from urllib.parse import urlencode
 from fastapi.responses import RedirectResponse
@@ -15,12 +16,11 @@ from starlette_admin.auth import (
 )
 from starlette_admin.exceptions import LoginFailed
 from starlette_admin.base import BaseAdmin
-from jose import JWTError, jwt
+from jose import JWTError
 
 from . import auth_service
 import exceptions
 from database import users
-from database.crud import async_session
 import settings
 
 
@@ -62,7 +62,13 @@ class UsernameAndPasswordProvider(AuthProvider):
             token = auth_service.create_access_token(
                 {"sub": user.username}, token_expires
             )
-            request.session.update({"token": token, "username": username})
+            request.session.update(
+                {
+                    "token": token,
+                    "username": username,
+                    "verified_until": self._verified_until(token_expires.total_seconds()),
+                }
+            )
             return response
         except exceptions.Unauthorized as e:
             raise LoginFailed("Invalid username or password") from e
@@ -73,23 +79,32 @@ class UsernameAndPasswordProvider(AuthProvider):
         if not token:
             return False
 
+        # session cookie is signed, so the stamp can be trusted until it runs out
+        if request.session.get("verified_until", 0) > time.time():
+            return True
+
         try:
-            payload = jwt.decode(
-                token, settings.auth.SECRET_KEY, algorithms=[settings.auth.ALGORITHM]
-            )
+            payload = auth_service.decode_token(token)
             username: str = payload.get("sub")
             if username is None:
                 return False
         except JWTError:
             return False
 
-        async with async_session() as session:
-            user = await users.get_user_by_username(username, session)
+        user = await users.get_cached_user_by_username(username)
         if user is None:
             return False
 
+        request.session["verified_until"] = self._verified_until(
+            payload["exp"] - time.time()
+        )
         return True
 
+    @staticmethod
+    def _verified_until(token_ttl: float) -> int:
+        recheck = settings.auth.ADMIN_SESSION_RECHECK_SECONDS
+        return int(time.time() + min(recheck, token_ttl))
+
     async def logout(self, request: Request, response: Response) -> Response:
         request.session.clear()
         return response
@@ -122,14 +137,14 @@ class AuthMiddleware(BaseHTTPMiddleware):
         self.allow_paths.extend(
             self.provider.allow_paths if self.provider.allow_paths is not None else []
         )
-        self.allow_paths = [self.provider.admin_prefix + p for p in self.allow_paths]
+        self.allow_paths = {self.provider.admin_prefix + p for p in self.allow_paths}
 
     async def dispatch(
         self, request: Request, call_next: RequestResponseEndpoint
     ) -> Response:
-        is_authenticated = await self.provider.is_authenticated(request)
-        request_path = request.scope["path"]
-        if request_path not in self.allow_paths and not is_authenticated:
+        if request.scope["path"] in self.allow_paths:
+            return await call_next(request)
+        if not await self.provider.is_authenticated(request):
             url = "{url}?{query_params}".format(
                 url=request.url_for(request.app.state.ROUTE_NAME + ":login"),
                 query_params=urlencode({"next": str(request.url)}),
@@ -1,48 +1,74 @@
+import asyncio
+import hashlib
+import hmac
 import logging
+import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Any, Literal, Optional
+from typing import Any, Optional
 
-from fastapi import BackgroundTasks, Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlmodel import delete, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 from tables.user import User
-from tables.auth import ResetPasswordCode
+from tables.auth import ResetPasswordCode, RefreshToken
 from schemas.token import TokenData, Token
 import settings
 import exceptions
 from utils import misc
+from utils.cache import TTLCache
 from database import users, crud as db
-from . import email_service
+from . import email_service, job_service
+from .hashing_service import averify_password, ahash_password, needs_rehash
 
 
 logger = logging.getLogger("auth")
 
-pwd_context = CryptContext(
-    schemes=settings.auth.SCHEMES, deprecated=settings.auth.DEPRECATED
-)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=settings.auth.TOKEN_URL)
 
+# keeps references to fire-and-forget tasks until they are done
+_background_tasks: set[asyncio.Task] = set()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# verified claims by token digest, each entry lives until its token expires
+token_cache: TTLCache[bytes, dict[str, Any]] = TTLCache(
+    settings.auth.TOKEN_CACHE_SIZE, ttl=0
+)
 
 
 async def authenticate_user(username: str, password: str) -> User:
     async with db.async_session() as session:  # type: ignore
         user = await users.get_user_by_username(username, session)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await averify_password(password, user.hashed_password):
         raise exceptions.Unauthorized(f"Incorrect username or password")
+    if needs_rehash(user.hashed_password):
+        task = asyncio.create_task(
+            rehash_user_password(user.username, password, user.hashed_password)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
     return user
 
 
+async def rehash_user_password(
+    username: str, password: str, old_hashed_password: str
+) -> None:
+    """Upgrades stored hash to the current policy, called after successful login"""
+    try:
+        new_hashed_password = await ahash_password(password)
+        async with db.async_session() as session:  # type: ignore
+            await users.update_user_password(
+                username, new_hashed_password, session, old_hashed_password
+            )
+        logger.info(f"Rehashed password for user={username}")
+    except Exception as e:
+        logger.error(f"Error rehashing password for user={username}: {e}")
+
+
 def create_access_token(data: dict[str, Any], expires: Optional[timedelta]) -> str:
     to_encode = data.copy()
     if expires:
@@ -59,6 +85,22 @@ def create_access_token(data: dict[str, Any], expires: Optional[timedelta]) -> s
     return encoded_jwt
 
 
+def decode_token(token: str) -> dict[str, Any]:
+    """Returns verified token claims, raises `JWTError` if token is invalid"""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(
+        token, settings.auth.SECRET_KEY, algorithms=[settings.auth.ALGORITHM]
+    )
+    exp = payload.get("exp")
+    if exp is not None:
+        token_cache.set(key, payload, ttl=exp - time.time())
+    return payload
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credential_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,9 +108,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         headers={"WWW_Authenticate": "Bearer"},
     )
     try:
-        payload: dict[str, Any] = jwt.decode(
-            token, settings.auth.SECRET_KEY, algorithms=[settings.auth.ALGORITHM]
-        )
+        payload = decode_token(token)
 
         username: str = payload.get("sub")  # type: ignore
         if username is None:
@@ -78,8 +118,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credential_exc
 
-    async with db.async_session() as session:  # type: ignore
-        user = await users.get_user_by_username(token_data.username, session)
+    user = await users.get_cached_user_by_username(token_data.username)
     if user is None:
         raise exceptions.NotFound("User not found")
 
@@ -99,38 +138,166 @@ async def process_token(
     token_expires = timedelta(minutes=settings.auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     if user:
         token = create_access_token({"sub": user.username}, token_expires)
-        return Token(access_token=token, token_type="bearer")
+        async with db.async_session() as session:  # type: ignore
+            refresh_token = await create_refresh_token(user.username, session)
+        return Token(
+            access_token=token, token_type="bearer", refresh_token=refresh_token
+        )
+
+
+def hash_refresh_token(token: str) -> str:
+    # token is random and long, so plain digest is enough to keep db leaks useless
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def create_refresh_token(username: str, session: AsyncSession) -> str:
+    token = secrets.token_urlsafe(32)
+    session.add(
+        RefreshToken(
+            hashed_token=hash_refresh_token(token),
+            username=username,
+            expires=misc.utcnow()
+            + timedelta(days=settings.auth.REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    await session.commit()
+    return token
+
+
+async def rotate_refresh_token(refresh_token: str, session: AsyncSession) -> Token:
+    """Consumes refresh token and issues new access and refresh tokens"""
+    stmt = (
+        delete(RefreshToken)
+        .where(RefreshToken.hashed_token == hash_refresh_token(refresh_token))
+        .where(RefreshToken.expires > misc.utcnow())
+        .returning(RefreshToken.username)
+    )
+    res = await session.execute(stmt)
+    username = res.scalar_one_or_none()
+    if username is None:
+        await session.rollback()
+        raise exceptions.Unauthorized("Invalid or expired refresh token")
+
+    token_expires = timedelta(minutes=settings.auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    token = create_access_token({"sub": username}, token_expires)
+    new_refresh_token = await create_refresh_token(username, session)
+    return Token(
+        access_token=token, token_type="bearer", refresh_token=new_refresh_token
+    )
+
+
+async def revoke_refresh_tokens(
+    session: AsyncSession,
+    refresh_token: str | None = None,
+    username: str | None = None,
+) -> None:
+    """Revokes single refresh token or all refresh tokens of the user"""
+    stmt = delete(RefreshToken)
+    if refresh_token is not None:
+        stmt = stmt.where(
+            RefreshToken.hashed_token == hash_refresh_token(refresh_token)
+        )
+    if username is not None:
+        stmt = stmt.where(RefreshToken.username == username)
+    await session.exec(stmt)  # type: ignore
+    await session.commit()
+
+
+def hash_reset_code(username: str, code: str) -> str:
+    # 6 digits gain nothing from an adaptive hash, keyed digest is enough
+    msg = f"{username}:{code}".encode()
+    return hmac.new(settings.auth.SECRET_KEY.encode(), msg, hashlib.sha256).hexdigest()
+
+
+async def create_reset_password_code(username: str, session: AsyncSession) -> None:
+    """Enqueues sending of a new code, the code itself is created by the job,
+    so plain code is never stored in the jobs table"""
+    if await users.get_user_by_username(username, session) is None:
+        raise exceptions.NotFound(f"User with username={username} not found")
+    await job_service.enqueue(
+        session, "send_reset_code", {"username": username}, queue="email"
+    )
 
 
-async def create_reset_password_code(
-    username: str, session: AsyncSession, bg_tasks: BackgroundTasks
-):
+@job_service.task("send_reset_code")
+async def send_reset_code_task(username: str) -> None:
     code = str(misc.random_6_digit_number())
-    logger.debug(f"{code=}")
-    reset_code = ResetPasswordCode(
-        username=username,
-        hashed_code=get_password_hash(code),
-        expires=misc.utcnow() + timedelta(minutes=30),
+    values = {
+        "hashed_code": hash_reset_code(username, code),
+        "expires": misc.utcnow()
+        + timedelta(minutes=settings.auth.RESET_CODE_EXPIRE_MINUTES),
+        "attempts": 0,
+    }
+    stmt = (
+        insert(ResetPasswordCode)
+        .values(username=username, **values)
+        .on_conflict_do_update(index_elements=["username"], set_=values)
     )
-    bg_tasks.add_task(email_service.send_confirmation_code_to_user, username, code)
+    async with db.async_session() as session:  # type: ignore
+        try:
+            await session.exec(stmt)  # type: ignore
+            # committed before sending, so neither the row lock nor the connection
+            # are held while waiting for SMTP
+            await session.commit()
+        except IntegrityError:
+            logger.warning(f"User={username} was deleted before reset code was sent")
+            return
     try:
-        return await db.upsert(reset_code, session, ResetPasswordCode, ["username"])
-    except IntegrityError as e:
-        raise exceptions.NotFound(f"User with username={username} not found") from e
+        await email_service.send_confirmation_code_to_user(username, code)
+    except Exception:
+        # no code is kept without the email, unless a newer one replaced it
+        async with db.async_session() as session:  # type: ignore
+            await session.exec(
+                delete(ResetPasswordCode).where(
+                    ResetPasswordCode.username == username,
+                    ResetPasswordCode.hashed_code == values["hashed_code"],
+                )
+            )
+            await session.commit()
+        raise
 
 
 async def verify_reset_password_code(
     username: str, plain_code: str, session: AsyncSession
-) -> Literal[True]:
-    code: ResetPasswordCode = await db.get_first_where(
-        session,
-        ResetPasswordCode,
-        ResetPasswordCode.username == username,
-        error_msg=f"Code for user={username} wasn't set",
+) -> str:
+    """Counts an attempt and checks the code, returns its digest if it is correct"""
+    stmt = (
+        update(ResetPasswordCode)
+        .where(ResetPasswordCode.username == username)
+        .values(attempts=ResetPasswordCode.attempts + 1)
+        .returning(
+            ResetPasswordCode.hashed_code,
+            ResetPasswordCode.expires,
+            ResetPasswordCode.attempts,
+        )
     )
-    is_correct = verify_password(plain_code, code.hashed_code)
-    if not is_correct:
+    res = await session.execute(stmt)
+    code = res.first()
+    await session.commit()
+    if code is None:
+        raise exceptions.NotFound(f"Code for user={username} wasn't set")
+
+    hashed_code = hash_reset_code(username, plain_code)
+    if code.attempts > settings.auth.RESET_CODE_MAX_ATTEMPTS:
+        raise exceptions.BadRequest("Too many attempts, consider resending email")
+    elif not hmac.compare_digest(hashed_code, code.hashed_code):
         raise exceptions.BadRequest("Code is incorrect")
     elif code.expires < misc.utcnow():
         raise exceptions.BadRequest("Code expired, consider resending email")
-    return True
+    return hashed_code
+
+
+async def reset_password(
+    username: str, plain_code: str, new_password: str, session: AsyncSession
+) -> None:
+    hashed_code = await verify_reset_password_code(username, plain_code, session)
+    # code is checked again while being consumed, so concurrent resets can't both win
+    is_updated = await users.reset_password_with_code(
+        username,
+        hashed_code,
+        await ahash_password(new_password),
+        settings.auth.RESET_CODE_MAX_ATTEMPTS,
+        session,
+    )
+    if not is_updated:
+        raise exceptions.BadRequest("Code is incorrect")
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import smtplib
 import ssl
@@ -18,33 +19,100 @@ class Message:
     receiver: str
 
 
-def send_email(message: Message) -> dict[str, tuple[int, str]]:
+def build_mime(message: Message) -> str:
     msg = MIMEMultipart()
     msg["From"] = email.EMAIL_FROM
     msg["To"] = message.receiver
     msg["Subject"] = message.subject
     msg.attach(MIMEText(message.body, "html"))
+    return msg.as_string()
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL(email.EMAIL_SERVER, email.EMAIL_PORT, context=context) as smtp:
+
+class SMTPConnection:
+    """Keeps one logged in SMTP connection open between sends"""
+
+    def __init__(self) -> None:
+        self.smtp: smtplib.SMTP_SSL | None = None
+
+    def connect(self) -> smtplib.SMTP_SSL:
+        context = ssl.create_default_context()
+        smtp = smtplib.SMTP_SSL(
+            email.EMAIL_SERVER,
+            email.EMAIL_PORT,
+            context=context,
+            timeout=email.EMAIL_TIMEOUT,
+        )
         smtp.login(email.EMAIL_USERNAME, email.EMAIL_PASSWORD)
-        result = smtp.sendmail(email.EMAIL_FROM, message.receiver, msg.as_string())
-    return result
+        return smtp
+
+    def send(self, message: Message) -> dict[str, tuple[int, str]]:
+        msg = build_mime(message)
+        if self.smtp is None:
+            self.smtp = self.connect()
+        try:
+            return self.smtp.sendmail(email.EMAIL_FROM, message.receiver, msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            # server drops idle connections, reconnect once and retry;
+            # not any OSError, SMTPException is one and means the server answered
+            self.close()
+            self.smtp = self.connect()
+            return self.smtp.sendmail(email.EMAIL_FROM, message.receiver, msg)
+
+    def close(self) -> None:
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
+
+class SMTPPool:
+    """Hands out a few persistent SMTP connections to concurrent senders"""
 
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._idle: asyncio.Queue[SMTPConnection] | None = None
 
-def send_confirmation_code_to_user(email: str, code: str | int) -> bool:
+    @property
+    def idle(self) -> asyncio.Queue[SMTPConnection]:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(SMTPConnection())
+        return self._idle
+
+    async def send(self, message: Message) -> dict[str, tuple[int, str]]:
+        connection = await self.idle.get()
+        try:
+            return await asyncio.to_thread(connection.send, message)
+        except Exception:
+            await asyncio.to_thread(connection.close)
+            raise
+        finally:
+            self.idle.put_nowait(connection)
+
+    async def close(self) -> None:
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            await asyncio.to_thread(self._idle.get_nowait().close)
+        self._idle = None
+
+
+smtp_pool = SMTPPool(email.EMAIL_CONNECTIONS)
+
+
+async def send_confirmation_code_to_user(email: str, code: str | int) -> None:
+    """Sends right away, plain code must not be stored in a job payload"""
     html = """
     <p>Ваш код подтверждения: <b>{code}</b></p> 
     """
-    try:
-        logger.info(f"Sending code confirmation to user={email}")
-        message = Message(
-            subject="Код подтверждения",
-            receiver=email,
-            body=html.format(code=code),
-        )
-        send_email(message)
-        return True
-    except Exception as e:
-        logger.error(f"Error sending email to user={email}: {e}")
-        return False
+    logger.info(f"Sending code confirmation to user={email}")
+    message = Message(
+        subject="Код подтверждения",
+        receiver=email,
+        body=html.format(code=code),
+    )
+    await smtp_pool.send(message)
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from passlib.context import CryptContext
+
+import exceptions
+import settings
+
+
+logger = logging.getLogger("hashing")
+
+T = TypeVar("T")
+
+
+def _context_options() -> dict[str, Any]:
+    options: dict[str, Any] = {}
+    rounds = settings.auth.BCRYPT_ROUNDS
+    if rounds is not None and "bcrypt" in settings.auth.SCHEMES:
+        # pinning min and max makes needs_update() flag hashes with any other cost
+        options.update(
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+    return options
+
+
+pwd_context = CryptContext(
+    schemes=settings.auth.SCHEMES,
+    deprecated=settings.auth.DEPRECATED,
+    **_context_options(),
+)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float, min_rounds: int = 4, max_rounds: int = 31
+) -> int:
+    """Returns the highest bcrypt cost which hashes within `target_ms` on this host"""
+    best = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+        elapsed_ms = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            context.hash("calibration-password")
+            elapsed_ms = min(elapsed_ms, (time.perf_counter() - start) * 1000)
+        logger.info(f"{rounds=}: {elapsed_ms:.1f} ms")
+        if elapsed_ms > target_ms:
+            break
+        best = rounds
+    return best
+
+
+class HashingPool:
+    """Runs CPU-bound hashing in a worker pool so it doesn't block the event loop.
+
+    `max_queue` bounds the number of calls that are running or waiting for a worker,
+    extra calls are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, executor_type: str, max_workers: int, max_queue: int) -> None:
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hashing"
+                )
+        return self._executor
+
+    def is_full(self) -> bool:
+        return self.pending >= self.max_queue
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.is_full():
+            logger.warning(f"Hashing queue is full ({self.pending=})")
+            raise exceptions.ServiceUnavailable(
+                "Server is busy, try again later", headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = HashingPool(
+    settings.auth.HASH_EXECUTOR, settings.auth.HASH_WORKERS, settings.auth.HASH_MAX_QUEUE
+)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await pool.run(verify_password, plain_password, hashed_password)
+
+
+async def ahash_password(password: str) -> str:
+    return await pool.run(get_password_hash, password)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick bcrypt cost for this host")
+    parser.add_argument("--target-ms", type=float, default=250)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"BCRYPT_ROUNDS={calibrate_bcrypt_rounds(args.target_ms)}")
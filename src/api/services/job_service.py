@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+
+from sqlmodel import delete, func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tables.jobs import Job
+from database.crud import async_session
+from utils import misc
+import settings
+
+
+logger = logging.getLogger("jobs")
+
+TaskHandler = Callable[..., Awaitable[Any]]
+
+tasks: dict[str, TaskHandler] = {}
+
+
+def task(name: str) -> Callable[[TaskHandler], TaskHandler]:
+    """Registers coroutine as a job handler, job payload is passed as kwargs"""
+
+    def decorator(handler: TaskHandler) -> TaskHandler:
+        tasks[name] = handler
+        return handler
+
+    return decorator
+
+
+async def enqueue(
+    session: AsyncSession,
+    task_name: str,
+    payload: dict[str, Any],
+    queue: str = "default",
+    delay: timedelta | None = None,
+) -> Job:
+    job = Job(
+        queue=queue,
+        task=task_name,
+        payload=payload,
+        max_attempts=settings.jobs.JOBS_MAX_ATTEMPTS,
+    )
+    if delay is not None:
+        job.run_at = misc.utcnow() + delay
+    session.add(job)
+    await session.commit()
+    return job
+
+
+class JobWorker:
+    """Polls one queue, claiming due jobs with `FOR UPDATE SKIP LOCKED`.
+
+    Claimed jobs are leased by moving `run_at` forward, so jobs of a crashed
+    worker become due again once the lease runs out.
+    """
+
+    def __init__(self, queue: str, concurrency: int) -> None:
+        self.queue = queue
+        self.concurrency = concurrency
+
+    async def claim(self) -> list[Job]:
+        due = (
+            select(Job.id)
+            .where(
+                Job.queue == self.queue,
+                Job.failed_at.is_(None),  # type: ignore
+                Job.run_at <= func.now(),
+            )
+            .order_by(Job.run_at)
+            .limit(self.concurrency)
+            .with_for_update(skip_locked=True)
+        )
+        lease = timedelta(seconds=settings.jobs.JOBS_LEASE_SECONDS)
+        stmt = (
+            update(Job)
+            .where(Job.id.in_(due))  # type: ignore
+            .values(attempts=Job.attempts + 1, run_at=func.now() + lease)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        async with async_session() as session:  # type: ignore
+            res = await session.scalars(stmt)
+            jobs = list(res.all())
+            await session.commit()
+        return jobs
+
+    async def execute(self, job: Job) -> Exception | None:
+        handler = tasks.get(job.task)
+        try:
+            if handler is None:
+                raise LookupError(f"Unknown task={job.task}")
+            await handler(**job.payload)
+        except Exception as e:
+            logger.error(f"Job id={job.id} task={job.task} failed: {e}")
+            return e
+
+    async def finish(self, jobs: list[Job], errors: list[Exception | None]) -> None:
+        done = [job.id for job, error in zip(jobs, errors) if error is None]
+        async with async_session() as session:  # type: ignore
+            if done:
+                await session.exec(delete(Job).where(Job.id.in_(done)))  # type: ignore
+            for job, error in zip(jobs, errors):
+                if error is None:
+                    continue
+                values: dict[str, Any] = {"last_error": repr(error)}
+                if job.attempts >= job.max_attempts:
+                    values["failed_at"] = func.now()
+                else:
+                    backoff = settings.jobs.JOBS_RETRY_BACKOFF_SECONDS * 2 ** (
+                        job.attempts - 1
+                    )
+                    values["run_at"] = func.now() + timedelta(seconds=backoff)
+                await session.exec(
+                    update(Job).where(Job.id == job.id).values(**values)  # type: ignore
+                )
+            await session.commit()
+
+    async def run(self) -> None:
+        logger.info(f"Starting job worker for queue={self.queue}")
+        while True:
+            try:
+                jobs = await self.claim()
+                if jobs:
+                    errors = await asyncio.gather(*(self.execute(job) for job in jobs))
+                    await self.finish(jobs, errors)
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker for queue={self.queue} failed: {e}")
+            await asyncio.sleep(settings.jobs.JOBS_POLL_INTERVAL_SECONDS)
+
+
+def start_workers() -> list[asyncio.Task]:
+    return [
+        asyncio.create_task(JobWorker(queue, concurrency).run())
+        for queue, concurrency in settings.jobs.JOBS_QUEUES.items()
+    ]
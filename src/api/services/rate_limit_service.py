@@ -0,0 +1,105 @@
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from starlette.requests import Request
+
+from tables.auth import RateLimitBucket
+from database import crud
+from utils.cache import TTLCache
+from . import hashing_service
+import exceptions
+import settings
+
+
+logger = logging.getLogger("rate_limit")
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def acquire(self, key: str, rate: float, capacity: int) -> float:
+        """Takes one token from the bucket, returns seconds to wait if it is empty"""
+
+
+class MemoryBackend(RateLimitBackend):
+    def __init__(self, max_keys: int) -> None:
+        self.buckets: TTLCache[str, tuple[float, float]] = TTLCache(max_keys, ttl=0)
+
+    async def acquire(self, key: str, rate: float, capacity: int) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        # a bucket untouched for capacity / rate seconds is full again, so drop it
+        self.buckets.set(key, (tokens - 1, now), ttl=capacity / rate)
+        return 0
+
+
+class PostgresBackend(RateLimitBackend):
+    async def acquire(self, key: str, rate: float, capacity: int) -> float:
+        table = RateLimitBucket.__table__  # type: ignore
+        elapsed = func.extract("epoch", func.now() - table.c.updated_at)
+        refilled = func.least(capacity, table.c.tokens + elapsed * rate)
+        stmt = (
+            insert(RateLimitBucket)
+            .values(key=key, tokens=capacity - 1, updated_at=func.now())
+            .on_conflict_do_update(
+                index_elements=["key"],
+                set_={"tokens": refilled - 1, "updated_at": func.now()},
+                where=refilled >= 1,
+            )
+            .returning(table.c.tokens)
+        )
+        async with crud.async_session() as session:  # type: ignore
+            res = await session.execute(stmt)
+            allowed = res.first() is not None
+            await session.commit()
+        return 0 if allowed else 1 / rate
+
+
+def _create_backend() -> RateLimitBackend:
+    if settings.rate_limit.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresBackend()
+    return MemoryBackend(settings.rate_limit.RATE_LIMIT_MAX_KEYS)
+
+
+backend = _create_backend()
+
+
+def get_refill_seconds() -> float:
+    """Time after which any bucket is full again, so it can be dropped"""
+    rate = settings.rate_limit.RATE_LIMIT_PER_MINUTE / 60
+    return settings.rate_limit.RATE_LIMIT_BURST / rate
+
+
+def _reject(retry_after: float) -> exceptions.TooManyRequests:
+    return exceptions.TooManyRequests(
+        "Too many requests, try again later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def check(scope: str, request: Request, username: str | None = None) -> None:
+    """Raises 429 if client IP or username ran out of tokens for `scope`.
+
+    Call it first thing in a route, so rejected requests never reach hashing or DB.
+    """
+    if hashing_service.pool.is_full():
+        raise _reject(1)
+
+    rate = settings.rate_limit.RATE_LIMIT_PER_MINUTE / 60
+    capacity = settings.rate_limit.RATE_LIMIT_BURST
+    client = request.client.host if request.client else "unknown"
+    keys = [f"{scope}:ip:{client}"]
+    if username:
+        keys.append(f"{scope}:user:{username.lower()}")
+
+    for key in keys:
+        retry_after = await backend.acquire(key, rate, capacity)
+        if retry_after:
+            logger.info(f"Rate limited {key=}")
+            raise _reject(retry_after)
@@ -0,0 +1,31 @@
+import asyncio
+import logging
+import os
+
+from database import crud, users
+from . import auth_service
+import settings
+
+
+logger = logging.getLogger("stats")
+
+
+def collect() -> dict[str, dict[str, int]]:
+    """Counters of in-process caches and coalesced lookups, since process start"""
+    return {
+        "user_cache": users.user_cache.stats(),
+        "user_flight": users.user_flight.stats(),
+        "token_cache": auth_service.token_cache.stats(),
+        "get_by_id_flight": crud.get_by_id_flight.stats(),
+    }
+
+
+async def run() -> None:
+    """Logs stats of this worker forever, started from app lifespan"""
+    interval = settings.env.STATS_LOG_INTERVAL_SECONDS
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        stats = ", ".join(f"{name}={values}" for name, values in collect().items())
+        logger.info(f"pid={os.getpid()} {stats}")
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import SQLModel, delete, func, select
+
+from tables.auth import ResetPasswordCode, RefreshToken, RateLimitBucket
+from tables.jobs import Job
+from database.crud import async_session
+from . import rate_limit_service
+import settings
+
+
+logger = logging.getLogger("sweeper")
+
+
+async def delete_expired(
+    db_table_type: type[SQLModel],
+    key_column: InstrumentedAttribute,
+    expires_column: InstrumentedAttribute,
+    batch_size: int,
+    retention: timedelta = timedelta(0),
+) -> int:
+    """Deletes rows expired more than `retention` ago in batches,
+    so a big backlog never holds long locks"""
+    total = 0
+    while True:
+        expired = (
+            select(key_column)
+            .where(expires_column < func.now() - retention)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = delete(db_table_type).where(key_column.in_(expired))
+        async with async_session() as session:  # type: ignore
+            res = await session.exec(stmt)  # type: ignore
+            await session.commit()
+        total += res.rowcount
+        if res.rowcount < batch_size:
+            return total
+
+
+async def sweep() -> None:
+    batch_size = settings.auth.EXPIRED_SWEEP_BATCH_SIZE
+    codes = await delete_expired(
+        ResetPasswordCode,
+        ResetPasswordCode.username,
+        ResetPasswordCode.expires,
+        batch_size,
+    )
+    tokens = await delete_expired(
+        RefreshToken, RefreshToken.hashed_token, RefreshToken.expires, batch_size
+    )
+    failed_jobs = await delete_expired(
+        Job,
+        Job.id,  # type: ignore
+        Job.failed_at,  # type: ignore
+        batch_size,
+        timedelta(days=settings.jobs.JOBS_FAILED_RETENTION_DAYS),
+    )
+    # username keys are chosen by clients, so full buckets must not pile up
+    buckets = await delete_expired(
+        RateLimitBucket,
+        RateLimitBucket.key,
+        RateLimitBucket.updated_at,  # type: ignore
+        batch_size,
+        timedelta(seconds=rate_limit_service.get_refill_seconds()),
+    )
+    if codes or tokens or failed_jobs or buckets:
+        logger.info(
+            f"Deleted expired {codes=}, {tokens=}, {failed_jobs=}, {buckets=}"
+        )
+
+
+async def run() -> None:
+    """Sweeps expired rows forever, started from app lifespan"""
+    while True:
+        try:
+            await sweep()
+        except Exception as e:
+            logger.error(f"Error sweeping expired rows: {e}")
+        await asyncio.sleep(settings.auth.EXPIRED_SWEEP_INTERVAL_SECONDS)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -9,6 +11,27 @@ class DbSettings(BaseSettings):
     POSTGRES_HOST: str
     POSTGRES_PORT: int
 
+    # read only routes are spread over replicas, e.g. '["replica1", "replica2"]'
+    POSTGRES_REPLICA_HOSTS: list[str] = []
+    # after a write, client reads from primary for this long
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # connection pool per engine per worker process, 3 workers by default
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 5
+    POSTGRES_POOL_TIMEOUT: float = 30
+    POSTGRES_POOL_RECYCLE: int = 1800
+    # prepared statements cached per connection
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100
+    # PgBouncer in transaction mode can't keep prepared statements between transactions
+    POSTGRES_PGBOUNCER: bool = False
+    # cache invalidation LISTEN holds a session, which PgBouncer in transaction
+    # mode doesn't keep, so with PgBouncer it connects to this Postgres host directly
+    POSTGRES_LISTEN_HOST: str | None = None
+    # otherwise `python bootstrap.py` migrates once per deploy and workers only
+    # check schema version, fine to enable for a single dev worker
+    MIGRATE_ON_STARTUP: bool = False
+
 
 class EnvSettings(BaseSettings):
     PROJECT_NAME: str
@@ -22,26 +45,83 @@ class EnvSettings(BaseSettings):
     SUPERUSER_USERNAME: str
     SUPERUSER_PASSWORD: str
 
+    # cache and single flight counters of each process are logged this often,
+    # 0 disables
+    STATS_LOG_INTERVAL_SECONDS: int = 60
+
 
 class AuthSettings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
 
     # CryptContext
     SCHEMES: list[str] = ["bcrypt"]
     DEPRECATED: str = "auto"
+    # bcrypt cost, pick with `make calibrate-bcrypt`, None keeps passlib default
+    BCRYPT_ROUNDS: int | None = None
+
+    # password hashing pool
+    HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    HASH_WORKERS: int = 2
+    HASH_MAX_QUEUE: int = 64
+
+    # authenticated users cache
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # decoded tokens cache
+    TOKEN_CACHE_SIZE: int = 4096
+
+    # admin panel re-checks session user at most once per this interval
+    ADMIN_SESSION_RECHECK_SECONDS: int = 60
+
+    # password reset codes
+    RESET_CODE_EXPIRE_MINUTES: int = 30
+    RESET_CODE_MAX_ATTEMPTS: int = 5
+
+    # background removal of expired reset codes and refresh tokens
+    EXPIRED_SWEEP_INTERVAL_SECONDS: int = 300
+    EXPIRED_SWEEP_BATCH_SIZE: int = 1000
 
     # token route
     TOKEN_URL: str = "/api/auth/login"
 
 
+class RateLimitSettings(BaseSettings):
+    # "postgres" shares buckets between workers, "memory" is per worker
+    RATE_LIMIT_BACKEND: Literal["memory", "postgres"] = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+
+    # token bucket for expensive auth routes, per client IP and per username
+    RATE_LIMIT_PER_MINUTE: float = 10
+    RATE_LIMIT_BURST: int = 5
+
+
+class JobSettings(BaseSettings):
+    # run job workers inside web workers, disable when `worker.py` runs separately
+    JOBS_IN_APP: bool = True
+    # queue name -> number of jobs run concurrently per process
+    JOBS_QUEUES: dict[str, int] = {"default": 4, "email": 2}
+    JOBS_POLL_INTERVAL_SECONDS: float = 1
+    JOBS_LEASE_SECONDS: int = 300
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_RETRY_BACKOFF_SECONDS: float = 5
+    # failed jobs are kept for inspection, then deleted by the sweeper
+    JOBS_FAILED_RETENTION_DAYS: int = 7
+
+
 class EmailSettings(BaseSettings):
     EMAIL_USERNAME: str
     EMAIL_PASSWORD: str
     EMAIL_FROM: str
     EMAIL_PORT: int
     EMAIL_SERVER: str
+    EMAIL_TIMEOUT: int = 10
+
+    # persistent connections per process
+    EMAIL_CONNECTIONS: int = 2
 
 
 load_dotenv()
@@ -49,3 +129,5 @@ db = DbSettings()  # type: ignore
 auth = AuthSettings()  # type: ignore
 env = EnvSettings()  # type: ignore
 email = EmailSettings()  # type: ignore
+rate_limit = RateLimitSettings()  # type: ignore
+jobs = JobSettings()  # type: ignore
@@ -3,3 +3,4 @@
 
 from .user import *
 from .auth import *
+from .jobs import *
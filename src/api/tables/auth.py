@@ -1,13 +1,46 @@
 from datetime import datetime
 
-from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, types
+from sqlmodel import SQLModel, Field, AutoString
+from sqlalchemy import Column, ForeignKey, types
 
 
 class ResetPasswordCode(SQLModel, table=True):
     __tablename__ = "reset_password_codes"
 
     username: str = Field(primary_key=True, foreign_key="users.username")
-    expires: datetime = Field(sa_column=Column(type_=types.TIMESTAMP(timezone=True)))
+    expires: datetime = Field(
+        sa_column=Column(type_=types.TIMESTAMP(timezone=True), index=True)
+    )
     hashed_code: str
-    
\ No newline at end of file
+    attempts: int = 0
+
+
+class RateLimitBucket(SQLModel, table=True):
+    __tablename__ = "rate_limit_buckets"
+
+    key: str = Field(primary_key=True)
+    tokens: float
+    updated_at: datetime = Field(
+        sa_column=Column(
+            type_=types.TIMESTAMP(timezone=True), nullable=False, index=True
+        )
+    )
+
+
+class RefreshToken(SQLModel, table=True):
+    __tablename__ = "refresh_tokens"
+
+    hashed_token: str = Field(primary_key=True)
+    username: str = Field(
+        sa_column=Column(
+            AutoString,
+            ForeignKey("users.username", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+    expires: datetime = Field(
+        sa_column=Column(
+            type_=types.TIMESTAMP(timezone=True), nullable=False, index=True
+        )
+    )
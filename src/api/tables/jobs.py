@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlmodel import Field
+from sqlalchemy import Column, Index, text, types
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .base import IntBasicModel
+from utils import misc
+
+
+class Job(IntBasicModel, table=True):
+    __tablename__ = "jobs"  # type: ignore
+    __table_args__ = (
+        # only pending jobs are ever polled, keep the index small
+        Index(
+            "ix_jobs_queue_run_at",
+            "queue",
+            "run_at",
+            postgresql_where=text("failed_at IS NULL"),
+        ),
+        Index(
+            "ix_jobs_failed_at",
+            "failed_at",
+            postgresql_where=text("failed_at IS NOT NULL"),
+        ),
+    )
+
+    queue: str = "default"
+    task: str
+    payload: dict[str, Any] = Field(
+        default_factory=dict, sa_column=Column(JSONB, nullable=False)
+    )
+    attempts: int = 0
+    max_attempts: int = 5
+    run_at: datetime = Field(
+        default_factory=misc.utcnow,
+        sa_column=Column(type_=types.TIMESTAMP(timezone=True), nullable=False),
+    )
+    failed_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(type_=types.TIMESTAMP(timezone=True))
+    )
+    last_error: Optional[str] = None
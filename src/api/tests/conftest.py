@@ -0,0 +1,10 @@
+import os
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+
+# settings are read on import, real environment and `.env` take precedence
+for key, value in dotenv_values(Path(__file__).parents[3] / ".env.example").items():
+    if value is not None:
+        os.environ.setdefault(key, value)
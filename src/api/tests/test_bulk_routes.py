@@ -0,0 +1,188 @@
+"""Bulk routes of `CRUDRouter` report missing ids and integrity errors per item.
+
+Needs a running Postgres from `POSTGRES_*` settings, skipped otherwise.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import crud
+from utils.crud_router import CRUDRouter
+
+
+class BulkParent(SQLModel, table=True):
+    __tablename__ = "test_bulk_parents"  # type: ignore
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: Optional[str] = Field(default=None, unique=True)
+
+
+class BulkChild(SQLModel, table=True):
+    __tablename__ = "test_bulk_children"  # type: ignore
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    parent_id: Optional[int] = Field(default=None, foreign_key="test_bulk_parents.id")
+
+
+TABLES = [BulkParent.__table__, BulkChild.__table__]  # type: ignore
+
+MISSING_ID = 999_999
+
+
+def make_app(engine: AsyncEngine) -> FastAPI:
+    app = FastAPI()
+    for model, prefix in [(BulkParent, "/parents"), (BulkChild, "/children")]:
+        router = (
+            CRUDRouter(model, prefix)
+            .add_bulk_create_route(model)
+            .add_bulk_update_route(model)
+            .add_bulk_delete_route(model)
+        )
+        app.include_router(router)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)  # type: ignore
+
+    async def get_session():
+        async with session_maker() as session:  # type: ignore
+            yield session
+
+    app.dependency_overrides[crud.get_async_session] = get_session
+    return app
+
+
+async def with_client(test: Callable[[httpx.AsyncClient], Awaitable[None]]) -> None:
+    engine = create_async_engine(crud.DB_URL, poolclass=NullPool)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.drop_all, tables=TABLES)
+            await connection.run_sync(SQLModel.metadata.create_all, tables=TABLES)
+        transport = httpx.ASGITransport(app=make_app(engine))  # type: ignore
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test(client)
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.drop_all, tables=TABLES)
+    finally:
+        await engine.dispose()
+
+
+def run(test: Callable[[httpx.AsyncClient], Awaitable[None]]) -> None:
+    try:
+        asyncio.run(asyncio.wait_for(with_client(test), timeout=30))
+    except (OSError, asyncio.TimeoutError) as e:
+        pytest.skip(f"Postgres is not available: {e}")
+
+
+def errors(body: dict[str, Any]) -> dict[int, str]:
+    return {error["index"]: error["detail"] for error in body["errors"]}
+
+
+async def create_parents(client: httpx.AsyncClient, *names: str) -> list[dict]:
+    res = await client.post("/parents/bulk/create", json=[{"name": n} for n in names])
+    assert res.status_code == 200
+    return res.json()["items"]
+
+
+def test_bulk_create_reports_integrity_errors():
+    async def test(client: httpx.AsyncClient):
+        await create_parents(client, "a")
+        res = await client.post(
+            "/parents/bulk/create", json=[{"name": "b"}, {"name": "a"}, {"name": "c"}]
+        )
+        assert res.status_code == 200
+        body = res.json()
+        assert [item["name"] for item in body["items"]] == ["b", "c"]
+        assert list(errors(body)) == [1]
+        assert errors(body)[1].startswith("Integrity error.")
+
+        res = await client.post(
+            "/children/bulk/create", json=[{"parent_id": MISSING_ID}]
+        )
+        assert res.status_code == 200
+        assert res.json()["items"] == []
+        assert errors(res.json())[0].startswith("Integrity error.")
+
+    run(test)
+
+
+def test_bulk_update_reports_missing_ids():
+    async def test(client: httpx.AsyncClient):
+        (parent,) = await create_parents(client, "a")
+        res = await client.patch(
+            "/parents/bulk/update", json=[{"id": MISSING_ID, "name": "x"}]
+        )
+        assert res.status_code == 200
+        assert res.json()["items"] == []
+        assert errors(res.json()) == {0: f"ID={MISSING_ID} doesn't exist"}
+
+        res = await client.patch(
+            "/parents/bulk/update",
+            json=[
+                {"id": parent["id"], "name": "b"},
+                {"id": MISSING_ID, "name": "x"},
+                {"name": "no id"},
+            ],
+        )
+        assert res.status_code == 200
+        assert res.json()["items"] == [{"id": parent["id"], "name": "b"}]
+        assert errors(res.json()) == {
+            1: f"ID={MISSING_ID} doesn't exist",
+            2: "ID is required",
+        }
+
+    run(test)
+
+
+def test_bulk_update_reports_integrity_errors():
+    async def test(client: httpx.AsyncClient):
+        first, second, third = await create_parents(client, "a", "b", "c")
+        res = await client.patch(
+            "/parents/bulk/update",
+            json=[
+                {"id": first["id"], "name": "x"},
+                {"id": second["id"], "name": "c"},
+                {"id": third["id"]},
+                {"id": MISSING_ID, "name": "y"},
+            ],
+        )
+        assert res.status_code == 200
+        body = res.json()
+        assert body["items"] == [
+            {"id": first["id"], "name": "x"},
+            {"id": third["id"], "name": "c"},
+        ]
+        assert sorted(errors(body)) == [1, 3]
+        assert errors(body)[1].startswith("Integrity error.")
+
+    run(test)
+
+
+def test_bulk_delete_reports_missing_ids_and_references():
+    async def test(client: httpx.AsyncClient):
+        first, second = await create_parents(client, "a", "b")
+        res = await client.post(
+            "/children/bulk/create", json=[{"parent_id": first["id"]}]
+        )
+        assert res.status_code == 200
+
+        res = await client.post("/parents/bulk/delete", json=[MISSING_ID])
+        assert res.status_code == 200
+        assert errors(res.json()) == {0: f"ID={MISSING_ID} doesn't exist"}
+
+        res = await client.post(
+            "/parents/bulk/delete", json=[first["id"], second["id"]]
+        )
+        assert res.status_code == 200
+        body = res.json()
+        assert body["items"] == [second]
+        assert list(errors(body)) == [0]
+        assert errors(body)[0].startswith("Integrity error.")
+
+    run(test)
@@ -0,0 +1,103 @@
+"""SMTP pool against a local aiosmtpd stand-in, plain SMTP instead of SMTP_SSL"""
+
+import asyncio
+import smtplib
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from services import email_service
+from services.email_service import Message, SMTPPool
+
+
+class Handler:
+    def __init__(self) -> None:
+        self.received: list[str] = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("rejected@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    handler = Handler()
+    port = free_port()
+    controllers = [Controller(handler, hostname="127.0.0.1", port=port)]
+    controllers[0].start()
+    connects = []
+
+    def connect(self) -> smtplib.SMTP:
+        connects.append(self)
+        return smtplib.SMTP("127.0.0.1", port, timeout=5)
+
+    def restart():
+        # drops every open client connection, like a server closing idle ones
+        controllers[0].stop()
+        controllers[0] = Controller(handler, hostname="127.0.0.1", port=port)
+        controllers[0].start()
+
+    monkeypatch.setattr(email_service.SMTPConnection, "connect", connect)
+    yield handler, connects, restart
+    controllers[0].stop()
+
+
+def message(receiver: str) -> Message:
+    return Message(subject="Subject", body="<p>Body</p>", receiver=receiver)
+
+
+def test_pool_reuses_connections(server):
+    handler, connects, _ = server
+
+    async def send():
+        pool = SMTPPool(2)
+        await asyncio.gather(*(pool.send(message(f"user{i}@mail.com")) for i in range(6)))
+        await pool.close()
+
+    asyncio.run(send())
+    assert sorted(handler.received) == sorted(f"user{i}@mail.com" for i in range(6))
+    assert len(connects) <= 2
+
+
+def test_pool_reconnects_on_drop(server):
+    handler, connects, restart = server
+
+    async def send():
+        pool = SMTPPool(1)
+        await pool.send(message("first@mail.com"))
+        restart()
+        await pool.send(message("second@mail.com"))
+        await pool.close()
+
+    asyncio.run(send())
+    assert handler.received == ["first@mail.com", "second@mail.com"]
+    assert len(connects) == 2
+
+
+def test_rejection_is_not_resent(server):
+    handler, connects, _ = server
+
+    async def send():
+        pool = SMTPPool(1)
+        try:
+            await pool.send(message("rejected@mail.com"))
+        finally:
+            await pool.close()
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        asyncio.run(send())
+    assert handler.received == []
+    assert len(connects) == 1
@@ -0,0 +1,114 @@
+"""Every filter and sort `crud.get_filter_operators` allows must be served by an index.
+
+Plans are checked with `enable_seqscan = off`: the planner still picks a sequential
+scan when no index can serve the condition, so such a plan means a missing index.
+Needs a running Postgres from `POSTGRES_*` settings, skipped otherwise.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy import Column, Index, String, select, text, types
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Field, SQLModel
+
+from database import crud
+from tables.user import User
+
+
+class FilterPlanItem(SQLModel, table=True):
+    __tablename__ = "test_filter_plan_items"  # type: ignore
+    __table_args__ = (
+        Index("ix_test_fpi_name", "name", postgresql_ops={"name": "text_pattern_ops"}),
+        Index("ix_test_fpi_code", "code", postgresql_using="hash"),
+        Index("ix_test_fpi_group_created", "group", "created_at"),
+        Index("ix_test_fpi_deleted", "deleted_at", postgresql_where=text("false")),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    code: str
+    slug: str = Field(sa_column=Column(String(collation="C"), index=True))
+    title: str = Field(index=True)
+    group: int
+    created_at: datetime = Field(sa_column=Column(types.TIMESTAMP(timezone=True)))
+    deleted_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(types.TIMESTAMP(timezone=True))
+    )
+    notes: str = ""
+
+
+MODELS = [User, FilterPlanItem]
+
+SAMPLE_VALUES = {int: 1, str: "a", datetime: datetime(2024, 1, 1)}
+
+
+def test_filter_operators_follow_indexes():
+    operators = crud.get_filter_operators(FilterPlanItem)
+    assert operators == {
+        "id": {"eq", "in", "gte", "lte"},
+        "name": {"eq", "in", "prefix"},
+        "code": {"eq", "in"},
+        "slug": {"eq", "in", "gte", "lte", "prefix"},
+        "title": {"eq", "in", "gte", "lte"},
+        "group": {"eq", "in", "gte", "lte"},
+    }
+
+
+def filter_statements(model: type[SQLModel]) -> list[tuple[str, Any]]:
+    table = model.__table__  # type: ignore
+    statements = []
+    for name, operators in crud.get_filter_operators(model).items():
+        value = SAMPLE_VALUES[crud.python_type(table.c[name])]
+        for operator in operators:
+            key = name if operator == "eq" else f"{name}__{operator}"
+            where = crud.build_filters(
+                model, {key: [value, value] if operator == "in" else value}
+            )
+            statements.append((key, select(model).where(*where)))
+            if operator == "gte":
+                for sort in (name, f"-{name}"):
+                    order_by = crud.build_order_by(model, sort)
+                    statement = select(model).order_by(*order_by).limit(20)
+                    statements.append((f"sort={sort}", statement))
+    return statements
+
+
+async def explain(connection: AsyncConnection, statement: Any) -> str:
+    sql = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    res = await connection.execute(text(f"EXPLAIN {sql}"))
+    return "\n".join(row[0] for row in res)
+
+
+async def collect_plans() -> dict[str, str]:
+    engine = create_async_engine(crud.DB_URL, poolclass=NullPool)
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            for model in MODELS:
+                await connection.run_sync(model.__table__.create, checkfirst=True)  # type: ignore
+                await connection.execute(text(f"ANALYZE {model.__tablename__}"))
+            await connection.execute(text("SET LOCAL enable_seqscan = off"))
+            plans = {}
+            for model in MODELS:
+                for key, statement in filter_statements(model):
+                    plans[f"{model.__name__}.{key}"] = await explain(connection, statement)
+            await transaction.rollback()
+            return plans
+    finally:
+        await engine.dispose()
+
+
+def test_allowed_filters_use_indexes():
+    try:
+        plans = asyncio.run(asyncio.wait_for(collect_plans(), timeout=30))
+    except (OSError, asyncio.TimeoutError) as e:
+        pytest.skip(f"Postgres is not available: {e}")
+    seq_scans = {key: plan for key, plan in plans.items() if "Seq Scan" in plan}
+    assert not seq_scans
@@ -1,12 +1,34 @@
+import csv
+import hashlib
+import inspect
+import io
+import math
 from enum import Enum
-from typing import Any
+from typing import Any, Awaitable, Callable, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import crud
-from ..schemas.responses import PaginatedItems
+from database import crud, invalidation
+from schemas.responses import BulkItems, PaginatedItems, partial_model
+from utils.cache import TTLCache
+from utils.fast_json import FastJSONResponse, get_adapter
+import exceptions
+
+
+TotalMode = Literal["none", "estimate", "exact"]
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+FIELDS_QUERY = Query(
+    default=None,
+    description="Comma separated columns to return, all columns by default",
+    examples=["id,name"],
+)
 
 
 class CRUDRouter(APIRouter):
@@ -17,6 +39,7 @@ class CRUDRouter(APIRouter):
         tags: list[str | Enum] | None = None,
         dependencies: list[Any] | None = None,
         responses: dict[int | str, dict[str, Any]] | None = None,
+        cache_size: int = 1024,
     ):
         super().__init__(
             prefix=prefix,
@@ -25,17 +48,44 @@ class CRUDRouter(APIRouter):
             responses=responses,
         )
         self.model = model
+        # serialized GET responses with their ETags, cleared on table writes
+        self.response_cache: TTLCache[str, tuple[bytes, str]] = TTLCache(
+            cache_size, ttl=0
+        )
+        # writes made by other workers or outside of this router
+        invalidation.subscribe(model.__tablename__, lambda *_: self._invalidate())
 
     def add_get_all_route(
         self,
         model: type[SQLModel],
         description: str | None = None,
         name: str | None = None,
+        pagination: Literal["offset", "cursor"] = "offset",
+        sort_by: str = "id",
+        cache_ttl: int | None = None,
+        filter_by: list[str] | None = None,
+        allow_unindexed: bool = False,
         **extra_args
     ):
+        """`pagination="cursor"` pages by opaque cursor over `sort_by`,
+        which must be a not nullable primary key, unique or indexed column.
+
+        `cache_ttl` enables in-process response cache with ETags for this route.
+
+        Filter parameters `column`, `column__in`, `column__gte`, `column__lte` and
+        `column__prefix` are generated for `filter_by` columns, or for all of them
+        if not given. Only operators an index can serve are allowed, unless
+        `allow_unindexed`. Offset pagination also sorts by the same columns.
+        """
+        operators = self._get_filter_operators(model, filter_by, allow_unindexed)
+        if pagination == "cursor":
+            self._check_keyset_column(model, sort_by)
+            route = self._get_all_by_cursor(model, sort_by, cache_ttl, operators)
+        else:
+            route = self._get_all(model, cache_ttl, operators)
         self.add_api_route(
             "",
-            self._get_all(model),
+            route,
             response_model=PaginatedItems[model],
             status_code=status.HTTP_200_OK,
             methods=["GET"],
@@ -50,11 +100,12 @@ class CRUDRouter(APIRouter):
         model: type[SQLModel],
         description: str | None = None,
         name: str | None = None,
+        cache_ttl: int | None = None,
         **extra_args
     ):
         self.add_api_route(
             "/{id}",
-            self._get_by_id(model),
+            self._get_by_id(model, cache_ttl),
             response_model=model,
             status_code=status.HTTP_200_OK,
             methods=["GET"],
@@ -121,22 +172,301 @@ class CRUDRouter(APIRouter):
         )
         return self
 
-    def _get_all(self, model: type[SQLModel]):
+    def add_bulk_create_route(
+        self,
+        model: type[SQLModel],
+        description: str | None = None,
+        name: str | None = None,
+        max_batch_size: int = crud.MAX_BULK_SIZE,
+        **extra_args
+    ):
+        self.add_api_route(
+            "/bulk/create",
+            self._bulk_create(model, max_batch_size),
+            response_model=BulkItems[model],
+            status_code=status.HTTP_200_OK,
+            methods=["POST"],
+            description=description,
+            name=name,
+            **extra_args
+        )
+        return self
+
+    def add_bulk_update_route(
+        self,
+        model: type[SQLModel],
+        description: str | None = None,
+        name: str | None = None,
+        max_batch_size: int = crud.MAX_BULK_SIZE,
+        **extra_args
+    ):
+        self.add_api_route(
+            "/bulk/update",
+            self._bulk_update(model, max_batch_size),
+            response_model=BulkItems[model],
+            status_code=status.HTTP_200_OK,
+            methods=["PATCH"],
+            description=description,
+            name=name,
+            **extra_args
+        )
+        return self
+
+    def add_bulk_delete_route(
+        self,
+        model: type[SQLModel],
+        description: str | None = None,
+        name: str | None = None,
+        max_batch_size: int = crud.MAX_BULK_SIZE,
+        **extra_args
+    ):
+        self.add_api_route(
+            "/bulk/delete",
+            self._bulk_delete(model, max_batch_size),
+            response_model=BulkItems[model],
+            status_code=status.HTTP_200_OK,
+            methods=["POST"],
+            description=description,
+            name=name,
+            **extra_args
+        )
+        return self
+
+    def add_export_route(
+        self,
+        model: type[SQLModel],
+        description: str | None = None,
+        name: str | None = None,
+        **extra_args
+    ):
+        """Streams whole table as NDJSON or CSV with constant memory use"""
+        self.add_api_route(
+            "/export/{file_format}",
+            self._export(model),
+            response_class=StreamingResponse,
+            status_code=status.HTTP_200_OK,
+            methods=["GET"],
+            description=description,
+            name=name,
+            **extra_args
+        )
+        return self
+
+    @staticmethod
+    def _check_keyset_column(model: type[SQLModel], sort_by: str):
+        column = model.__table__.c.get(sort_by)  # type: ignore
+        if column is None:
+            raise ValueError(f"{model.__name__} has no column {sort_by!r}")
+        if column.nullable or not (column.primary_key or column.index or column.unique):
+            raise ValueError(
+                f"Cursor column {sort_by!r} must be not nullable and indexed"
+            )
+
+    @staticmethod
+    def _get_filter_operators(
+        model: type[SQLModel], filter_by: list[str] | None, allow_unindexed: bool
+    ) -> dict[str, set[str]]:
+        operators = crud.get_filter_operators(model, allow_unindexed)
+        if filter_by is None:
+            return operators
+        for column in filter_by:
+            if column not in model.__table__.c:  # type: ignore
+                raise ValueError(f"{model.__name__} has no column {column!r}")
+            if column not in operators:
+                raise ValueError(f"Filter column {column!r} must be indexed")
+        return {column: operators[column] for column in filter_by}
+
+    @staticmethod
+    def _filters(model: type[SQLModel], operators: dict[str, set[str]]):
+        """Dependency with a query parameter per column and operator,
+        returns conditions for the given ones"""
+        parameters = []
+        for name, column_operators in operators.items():
+            python_type = crud.python_type(model.__table__.c[name])  # type: ignore
+            for operator in crud.FILTER_OPERATORS:
+                if operator not in column_operators:
+                    continue
+                annotation = list[python_type] if operator == "in" else python_type
+                parameters.append(
+                    inspect.Parameter(
+                        name if operator == "eq" else f"{name}__{operator}",
+                        inspect.Parameter.KEYWORD_ONLY,
+                        default=Query(default=None),
+                        annotation=Optional[annotation],
+                    )
+                )
+
+        def dependency(**values: Any) -> list:
+            return crud.build_filters(model, values)
+
+        dependency.__signature__ = inspect.Signature(parameters)  # type: ignore
+        return dependency
+
+    def _get_all(
+        self,
+        model: type[SQLModel],
+        cache_ttl: int | None = None,
+        operators: dict[str, set[str]] | None = None,
+    ):
+        operators = operators or {}
+        sortable = {name for name, ops in operators.items() if "gte" in ops}
+        sort_description = (
+            f"One of {', '.join(sorted(sortable))}, `-` prefix for descending order"
+        )
+
         async def route(
+            request: Request,
             offset: int = Query(default=0, ge=0),
             limit: int = Query(default=crud.DEFAULT_LIMIT, le=crud.DEFAULT_LIMIT, ge=0),
-            session: AsyncSession = Depends(crud.get_async_session),
+            total: TotalMode = Query(default="none"),
+            fields: str | None = FIELDS_QUERY,
+            sort: str | None = Query(
+                default=None,
+                description=sort_description,
+                examples=["-id"],
+            ),
+            where: list = Depends(self._filters(model, operators)),
+            session: AsyncSession = Depends(crud.get_read_session),
         ):
-            items = await crud.get_all(session, model, offset, limit)
-            return PaginatedItems(items=items)
+            columns = crud.parse_fields(model, fields)
+            if sort is not None and sort.removeprefix("-") not in sortable:
+                raise exceptions.BadRequest(detail=f"Can't sort by {sort!r}")
+            order_by = None if sort is None else crud.build_order_by(model, sort)
+
+            async def load():
+                items = await crud.get_all(
+                    session, model, offset, limit, columns, where, order_by
+                )
+                page = PaginatedItems(
+                    items=self._partial_items(model, columns, items),
+                    page_index=offset // limit if limit else 0,
+                    page_size=limit,
+                )
+                return await self._fill_total(page, total, session, model, where)
+
+            return await self._respond(request, model, columns, cache_ttl, load, True)
 
         return route
 
-    def _get_by_id(self, model: type[SQLModel]):
+    def _get_all_by_cursor(
+        self,
+        model: type[SQLModel],
+        sort_by: str,
+        cache_ttl: int | None = None,
+        operators: dict[str, set[str]] | None = None,
+    ):
         async def route(
-            object_id: int, session: AsyncSession = Depends(crud.get_async_session)
+            request: Request,
+            cursor: str | None = Query(default=None),
+            limit: int = Query(default=crud.DEFAULT_LIMIT, le=crud.DEFAULT_LIMIT, ge=1),
+            total: TotalMode = Query(default="none"),
+            fields: str | None = FIELDS_QUERY,
+            where: list = Depends(self._filters(model, operators or {})),
+            session: AsyncSession = Depends(crud.get_read_session),
+        ):
+            columns = crud.parse_fields(model, fields)
+
+            async def load():
+                items, next_cursor = await crud.get_page_after(
+                    session, model, cursor, limit, sort_by, columns, where
+                )
+                page = PaginatedItems(
+                    items=self._partial_items(model, columns, items),
+                    page_size=limit,
+                    next_cursor=next_cursor,
+                )
+                return await self._fill_total(page, total, session, model, where)
+
+            return await self._respond(request, model, columns, cache_ttl, load, True)
+
+        return route
+
+    async def _respond(
+        self,
+        request: Request,
+        model: type[SQLModel],
+        columns: tuple[str, ...] | None,
+        cache_ttl: int | None,
+        load: Callable[[], Awaitable[Any]],
+        paginated: bool = False,
+    ) -> Any:
+        """Serializes database output without `response_model` validation,
+        partial responses wouldn't even pass it"""
+        item_type = model if columns is None else partial_model(model, columns)
+        response_type = PaginatedItems[item_type] if paginated else item_type
+        if cache_ttl is not None:
+            adapter = get_adapter(response_type)
+            return await self._cached_response(request, adapter, cache_ttl, load)
+        return FastJSONResponse(await load(), response_type)
+
+    @staticmethod
+    def _partial_items(
+        model: type[SQLModel], columns: tuple[str, ...] | None, items: list
+    ) -> list:
+        if columns is None:
+            return items
+        item_type = partial_model(model, columns)
+        # rows come straight from the database, so they are not validated again
+        return [item_type.model_construct(**item) for item in items]
+
+    async def _cached_response(
+        self,
+        request: Request,
+        adapter: TypeAdapter,
+        cache_ttl: int,
+        load: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """Serves serialized body from cache, or `304` if client has the same ETag"""
+        key = f"{request.url.path}?{request.url.query}"
+        cached = self.response_cache.get(key)
+        if cached is None:
+            body = adapter.dump_json(await load())
+            etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            cached = (body, etag)
+            self.response_cache.set(key, cached, ttl=cache_ttl)
+
+        body, etag = cached
+        # clients revalidate every time, which is cheap thanks to the cache
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in client_etags or etag.removeprefix("W/") in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def _invalidate(self):
+        self.response_cache.clear()
+
+    @staticmethod
+    async def _fill_total(
+        page: PaginatedItems,
+        total: TotalMode,
+        session: AsyncSession,
+        model: type[SQLModel],
+        where: list | None = None,
+    ) -> PaginatedItems:
+        if total == "none":
+            return page
+        page.total = await crud.count(
+            session, model, estimate=total == "estimate", where=where
+        )
+        if page.page_size:
+            page.total_pages = math.ceil(page.total / page.page_size)
+        return page
+
+    def _get_by_id(self, model: type[SQLModel], cache_ttl: int | None = None):
+        async def route(
+            request: Request, object_id: int, fields: str | None = FIELDS_QUERY
         ):
-            return await crud.get_by_id(object_id, session, model)
+            columns = crud.parse_fields(model, fields)
+
+            async def load():
+                item = await crud.get_by_id_shared(
+                    object_id, model, crud.reads_from_primary(request), columns
+                )
+                return self._partial_items(model, columns, [item])[0]
+
+            return await self._respond(request, model, columns, cache_ttl, load)
 
         return route
 
@@ -145,7 +475,9 @@ class CRUDRouter(APIRouter):
             data: model,
             session: AsyncSession = Depends(crud.get_async_session),
         ):
-            return await crud.create(data, session, model)
+            item = await crud.create(data, session, model)
+            self._invalidate()
+            return FastJSONResponse(item, model)
 
         return route
 
@@ -153,7 +485,9 @@ class CRUDRouter(APIRouter):
         async def route(
             object_id: int, session: AsyncSession = Depends(crud.get_async_session)
         ):
-            return await crud.delete_by_id(object_id, session, model)
+            item = await crud.delete_by_id(object_id, session, model)
+            self._invalidate()
+            return FastJSONResponse(item, model)
 
         return route
 
@@ -163,6 +497,85 @@ class CRUDRouter(APIRouter):
             data: model,
             session: AsyncSession = Depends(crud.get_async_session),
         ):
-            return await crud.update_by_id(object_id, session, data, model)
+            item = await crud.update_by_id(object_id, session, data, model)
+            self._invalidate()
+            return FastJSONResponse(item, model)
+
+        return route
+
+    @staticmethod
+    def _check_batch_size(items: list, max_batch_size: int):
+        if len(items) > max_batch_size:
+            raise exceptions.BadRequest(
+                detail=f"Batch is too big, max size is {max_batch_size}"
+            )
+
+    def _bulk_create(self, model: type[SQLModel], max_batch_size: int):
+        async def route(
+            data: list[model],
+            session: AsyncSession = Depends(crud.get_async_session),
+        ):
+            self._check_batch_size(data, max_batch_size)
+            result = await crud.bulk_create(data, session, model)
+            self._invalidate()
+            return FastJSONResponse(BulkItems.from_result(*result), BulkItems[model])
+
+        return route
+
+    def _bulk_update(self, model: type[SQLModel], max_batch_size: int):
+        async def route(
+            data: list[model],
+            session: AsyncSession = Depends(crud.get_async_session),
+        ):
+            self._check_batch_size(data, max_batch_size)
+            result = await crud.bulk_update(data, session, model)
+            self._invalidate()
+            return FastJSONResponse(BulkItems.from_result(*result), BulkItems[model])
+
+        return route
+
+    def _bulk_delete(self, model: type[SQLModel], max_batch_size: int):
+        async def route(
+            ids: list[int] = Body(),
+            session: AsyncSession = Depends(crud.get_async_session),
+        ):
+            self._check_batch_size(ids, max_batch_size)
+            result = await crud.bulk_delete(ids, session, model)
+            self._invalidate()
+            return FastJSONResponse(BulkItems.from_result(*result), BulkItems[model])
+
+        return route
+
+    def _export(self, model: type[SQLModel]):
+        async def route(file_format: ExportFormat):
+            if file_format == "csv":
+                chunks = self._export_csv(model)
+            else:
+                chunks = self._export_ndjson(model)
+            filename = f"{model.__tablename__}.{file_format}"  # type: ignore
+            return StreamingResponse(
+                chunks,
+                media_type=EXPORT_MEDIA_TYPES[file_format],
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            )
 
         return route
+
+    @staticmethod
+    async def _export_ndjson(model: type[SQLModel]):
+        async for batch in crud.stream_all(model):
+            yield "".join(item.model_dump_json() + "\n" for item in batch)
+
+    @staticmethod
+    async def _export_csv(model: type[SQLModel]):
+        fields = list(model.model_fields)
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        async for batch in crud.stream_all(model):
+            writer.writerows(item.model_dump(mode="json") for item in batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
@@ -0,0 +1,41 @@
+"""Response path for trusted output, which already matches the response model.
+
+FastAPI validates returned objects against `response_model` once more and then
+encodes them through `jsonable_encoder` and `json`. Returning `FastJSONResponse`
+skips both: content is serialized straight to bytes by pydantic-core with
+a `TypeAdapter` built once per type, and `response_model` is used only for docs.
+"""
+
+from functools import lru_cache
+from typing import Any, Mapping
+
+from fastapi import Response, status
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=512)
+def get_adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def dump_json(content: Any, response_type: Any = None) -> bytes:
+    """`response_type` is required when `content` is not an instance of it,
+    e.g. for unparametrized generics"""
+    return get_adapter(response_type or type(content)).dump_json(content)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        response_type: Any = None,
+        status_code: int = status.HTTP_200_OK,
+        headers: Mapping[str, str] | None = None,
+    ) -> None:
+        self.response_type = response_type
+        super().__init__(content, status_code, headers)
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content, self.response_type)
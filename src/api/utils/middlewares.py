@@ -0,0 +1,28 @@
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+
+from database import crud
+import settings
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """Pins client reads to primary for a while after it used a write session,
+    so replica lag never hides its own changes"""
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        response = await call_next(request)
+        if crud.replica_sessions and getattr(request.state, "db_wrote", False):
+            seconds = settings.db.READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                crud.PRIMARY_COOKIE,
+                str(int(time.time()) + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="lax",
+            )
+        return response
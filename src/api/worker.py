@@ -0,0 +1,20 @@
+import asyncio
+import logging
+
+from services import job_service
+from services import email_service
+from services import auth_service  # registers reset code task
+
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def main():
+    try:
+        await asyncio.gather(*job_service.start_workers())
+    finally:
+        await email_service.smtp_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())